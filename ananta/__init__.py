@@ -18,3 +18,6 @@ RESET = "\033[0m"
 
 # Large height for long outputs
 LINES = 1000
+
+# Lines buffered per host before the SSH reader waits for the display
+OUTPUT_QUEUE_SIZE = 4096
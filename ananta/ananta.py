@@ -9,29 +9,36 @@ import argparse
 import asyncio
 import os
 import sys
+from functools import lru_cache
 from types import ModuleType
-from typing import Dict, List
+from typing import List, Tuple
 
-from . import __version__
+from . import OUTPUT_QUEUE_SIZE, __version__
 from .config import get_hosts
 from .output import print_output  # Used by non-TUI mode
 from .ssh import execute  # Used by non-TUI mode
 
 uvloop: ModuleType | None = None
-try:
-    import warnings
+# uvloop and winloop do not support free-threaded (no-GIL) builds, so do
+# not even try to import them there and use the stdlib loop instead
+if getattr(sys, "_is_gil_enabled", lambda: True)():
+    try:
+        import warnings
 
-    with warnings.catch_warnings():
-        warnings.simplefilter(
-            "ignore",
-            category=DeprecationWarning,
-        )
-        if sys.platform == "win32":
-            import winloop as uvloop
-        else:
-            import uvloop
-except ImportError:
-    pass  # uvloop or winloop is an optional for speedup, not a requirement
+        with warnings.catch_warnings():
+            warnings.simplefilter(
+                "ignore",
+                category=DeprecationWarning,
+            )
+            if sys.platform == "win32":
+                import winloop as uvloop
+            else:
+                import uvloop
+    except ImportError:
+        pass  # uvloop or winloop is an optional for speedup, not a requirement
+
+# Default upper bound of hosts being worked on at once in non-TUI mode
+MAX_CONCURRENT_HOSTS = (os.cpu_count() or 1) * 32
 
 
 async def main(  # This is the non-TUI main function
@@ -44,6 +51,7 @@ async def main(  # This is the non-TUI main function
     default_key: str | None,
     color: bool,
     host_tags: str | None,
+    max_concurrency: int = MAX_CONCURRENT_HOSTS,
 ) -> None:
     """Main function to execute commands on multiple remote hosts (non-TUI mode)."""
 
@@ -53,81 +61,67 @@ async def main(  # This is the non-TUI main function
         print("No hosts found to execute the command on.")
         return
 
-    # Dictionary to hold separate output queues for each host
-    output_queues: Dict[str, asyncio.Queue[str | None]] = {
-        host_name: asyncio.Queue() for host_name, *_ in hosts_to_execute
-    }
-
-    # Create a lock for synchronizing output printing
-    print_lock = asyncio.Lock()
-
-    # Create a separate task for each host to print the output
-    print_tasks = [
+    # One queue shared by all hosts carries (host_name, output) pairs to a
+    # single printing task
+    output_queue: asyncio.Queue[Tuple[str, str] | None] = asyncio.Queue(
+        maxsize=OUTPUT_QUEUE_SIZE
+    )
+    printing_task = asyncio.create_task(
         print_output(
-            host_name,
             max_name_length,
             allow_empty_line,
             allow_cursor_control,
             separate_output,
-            print_lock,
-            output_queues[host_name],
+            output_queue,
             color,
+            [host_name for host_name, *_ in hosts_to_execute],
         )
-        for host_name, *_ in hosts_to_execute
-    ]
-    # Ensure future is created for Python 3.10 compatibility with some asyncio versions
-    # For modern asyncio, ensure_future is often not needed for create_task results.
-    # However, gathering them is the main point.
-    # asyncio.gather itself will schedule them if they are bare coroutines.
-    # If they are already tasks, gather works fine.
-    # Let's keep ensure_future for clarity or remove if targeting only very new Python/asyncio.
-    # For now, let's rely on gather to handle it.
-    # asyncio.ensure_future(asyncio.gather(*print_tasks)) # Old way
-    # Modern way: just gather the coroutines/tasks.
-    # If print_output are coroutines, gather will schedule them.
-    # If they are already tasks (e.g. from create_task), gather awaits them.
-    # The list comprehension creates coroutines, so gather will schedule them.
-
-    # We need to ensure print_tasks are running in the background
-    # while execute tasks are also running.
-    # One way is to create tasks for them and then gather execute tasks.
-
-    printing_task_group = asyncio.gather(*print_tasks)
-
-    # Create a task for each host to execute the SSH command
-    exec_tasks = [
-        execute(
+    )
+
+    # A fixed pool of workers takes hosts from one shared iterator, so no
+    # more than max_concurrency hosts (and coroutines) are live at a time
+    pending_hosts = iter(hosts_to_execute)
+
+    async def worker() -> None:
+        for (
             host_name,
             ip_address,
             ssh_port,
             username,
             key_path,
-            ssh_command,
-            max_name_length,
-            local_display_width,
-            separate_output,
-            default_key,
-            output_queues[host_name],  # Pass the queue here
-            color,
             timeout,
             retries,
-        )
-        for host_name, ip_address, ssh_port, username, key_path, timeout, retries in hosts_to_execute
-    ]
+        ) in pending_hosts:
+            await execute(
+                host_name,
+                ip_address,
+                ssh_port,
+                username,
+                key_path,
+                ssh_command,
+                max_name_length,
+                local_display_width,
+                separate_output,
+                default_key,
+                output_queue,  # Pass the shared queue here
+                color,
+                timeout,
+                retries,
+            )
 
-    # Execute all command execution tasks concurrently
-    await asyncio.gather(*exec_tasks)
+    worker_count = min(max_concurrency, len(hosts_to_execute))
+    await asyncio.gather(*(worker() for _ in range(worker_count)))
 
-    # After all exec_tasks are done, signal end to print_tasks
-    for host_name in output_queues:
-        await output_queues[host_name].put(None)
+    # After all hosts are done, signal end to the printing task
+    await output_queue.put(None)
 
-    # Wait for all printing tasks to complete
-    await printing_task_group
+    # Wait for the printing task to complete
+    await printing_task
 
 
-def run_cli() -> None:
-    """Command-line interface for Ananta."""
+@lru_cache(maxsize=1)
+def _build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser once per process."""
     parser = argparse.ArgumentParser(
         description="Execute commands on multiple remote hosts via SSH."
     )
@@ -211,20 +205,22 @@ def run_cli() -> None:
         type=str,
         help="Path to default SSH private key",
     )
-    args: argparse.Namespace = parser.parse_args()
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=MAX_CONCURRENT_HOSTS,
+        help=(
+            "Maximum number of hosts to run the command on at once "
+            f"(for non-TUI mode, default: {MAX_CONCURRENT_HOSTS})"
+        ),
+    )
+    return parser
 
-    if uvloop and not (args.tui or args.tui_light):
-        # To maintain compatibility with tests while addressing deprecation
-        # Suppress the deprecation warning for the necessary function call
-        import warnings
 
-        with warnings.catch_warnings():
-            warnings.filterwarnings(
-                "ignore",
-                message=".*set_event_loop_policy.*",
-                category=DeprecationWarning,
-            )
-            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+def run_cli() -> None:
+    """Command-line interface for Ananta."""
+    parser = _build_parser()
+    args: argparse.Namespace = parser.parse_args()
 
     if args.version:
         # Print the version of Ananta with the asyncio event loop module
@@ -276,7 +272,8 @@ def run_cli() -> None:
             allow_empty_line=args.allow_empty_line,
             light_theme=args.tui_light,
         )
-        app.run()  # This will block until the TUI exits
+        # This will block until the TUI exits
+        app.run(loop_factory=uvloop.new_event_loop if uvloop else None)
         sys.exit(0)  # Exit after TUI finishes
 
     # Non-TUI mode continues from here
@@ -287,28 +284,54 @@ def run_cli() -> None:
         parser.print_help()
         sys.exit(1)  # Exit with error if no command for non-TUI
 
-    try:
-        local_display_width: int = args.terminal_width or int(
-            os.environ.get("COLUMNS", os.get_terminal_size().columns)
-        )
-    except OSError:
-        local_display_width = args.terminal_width or 80
+    if args.max_concurrency < 1:
+        parser.error("--max-concurrency must be at least 1")
+
+    # Only ask the terminal (an ioctl) when neither -w nor COLUMNS is set
+    local_display_width: int = args.terminal_width
+    if not local_display_width:
+        columns = os.environ.get("COLUMNS")
+        try:
+            local_display_width = (
+                int(columns) if columns else os.get_terminal_size().columns
+            )
+        except OSError:
+            local_display_width = 80
 
     color = not args.no_color
 
-    asyncio.run(
-        main(
-            host_file,
-            ssh_command_str,
-            local_display_width,
-            args.separate_output,
-            args.allow_empty_line,
-            args.allow_cursor_control,
-            args.default_key,
-            color,
-            args.host_tags,
-        )
+    coro = main(
+        host_file,
+        ssh_command_str,
+        local_display_width,
+        args.separate_output,
+        args.allow_empty_line,
+        args.allow_cursor_control,
+        args.default_key,
+        color,
+        args.host_tags,
+        args.max_concurrency,
     )
+    if sys.version_info >= (3, 11):
+        # Build the uvloop/winloop loop directly rather than through the
+        # (deprecated) global event loop policy
+        with asyncio.Runner(
+            loop_factory=uvloop.new_event_loop if uvloop else None
+        ) as runner:
+            runner.run(coro)
+    else:
+        if uvloop:
+            # Suppress the deprecation warnings install() may raise
+            import warnings
+
+            with warnings.catch_warnings():
+                warnings.filterwarnings(
+                    "ignore",
+                    message=".*(install|set_event_loop_policy).*",
+                    category=DeprecationWarning,
+                )
+                uvloop.install()
+        asyncio.run(coro)
 
 
 if __name__ == "__main__":
@@ -1,16 +1,31 @@
 import csv
+import importlib
+import io
 import os
 import sys
-from typing import Any, Dict, List, Set, Tuple
+from functools import lru_cache
+from types import ModuleType
+from typing import Any, Dict, Iterable, List, Sequence, Set, Tuple
 
-# Conditional import for TOML parsing
-if sys.version_info >= (3, 11):
-    import tomllib  # pylint: disable=unused-import
-else:
+# tomllib (or tomli on Python < 3.11) is only imported once a TOML host
+# file is read, so CSV runs do not pay for loading the parser
+_UNSET: Any = object()
+tomllib: ModuleType | None = _UNSET
+
+
+def _import_tomllib() -> None:
+    """Import tomllib, or tomli as a fallback, on first use."""
+    global tomllib
+    if tomllib is not _UNSET:
+        return
     try:
-        import tomli as tomllib  # Alias tomli as tomllib for consistent use
+        tomllib = importlib.import_module("tomllib")
     except ImportError:
-        tomllib = None  # type: ModuleType | None
+        try:
+            # Alias tomli as tomllib for consistent use
+            tomllib = importlib.import_module("tomli")
+        except ImportError:
+            tomllib = None
 
 
 def _load_toml_data(toml_file_path: str) -> Dict[str, Any]:
@@ -18,6 +33,7 @@ def _load_toml_data(toml_file_path: str) -> Dict[str, Any]:
     Loads data from a TOML file using the appropriate library (tomllib or tomli).
     Raises RuntimeError if tomli is needed but not installed on Python < 3.11.
     """
+    _import_tomllib()
     if tomllib:
         with open(
             toml_file_path, "rb"
@@ -61,24 +77,43 @@ def _get_hosts_from_toml(
     """
     Reads hosts from a TOML file and returns a list of tuples with host details.
     """
+    messages: List[str] = []
+    try:
+        return _read_hosts_from_toml(
+            toml_file_path, host_tags_filter_str, messages
+        )
+    finally:
+        _print_messages(messages)
+
+
+def _read_hosts_from_toml(
+    toml_file_path: str, host_tags_filter_str: str | None, messages: List[str]
+) -> Tuple[List[Tuple[str, str, int, str, str, float, int]], int]:
+    """
+    Reads hosts from a TOML file, adding warnings and errors to messages.
+    """
     hosts_to_execute: List[Tuple[str, str, int, str, str, float, int]] = []
     active_tags_filter: Set[str] = (
         set(host_tags_filter_str.split(",")) if host_tags_filter_str else set()
     )
 
+    # Imported here too, for the TOMLDecodeError handler below
+    _import_tomllib()
     try:
         data = _load_toml_data(toml_file_path)
     except FileNotFoundError:
-        print(f"Error: TOML hosts file not found at '{toml_file_path}'")
+        messages.append(
+            f"Error: TOML hosts file not found at '{toml_file_path}'"
+        )
         return [], 0
     except RuntimeError as e:
-        print(f"Error: {e}")
+        messages.append(f"Error: {e}")
         return [], 0
     except tomllib.TOMLDecodeError if tomllib else Exception as e:
-        print(f"Error decoding TOML file '{toml_file_path}': {e}")
+        messages.append(f"Error decoding TOML file '{toml_file_path}': {e}")
         return [], 0
     except Exception as e:
-        print(
+        messages.append(
             f"An unexpected error occurred while loading TOML file "
             f"'{toml_file_path}': {e}"
         )
@@ -86,7 +121,7 @@ def _get_hosts_from_toml(
 
     defaults = data.get("default", {})
     if not isinstance(defaults, dict):
-        print(
+        messages.append(
             f"Warning: Skipping non-dictionary 'default' section in '{toml_file_path}'."
         )
         defaults = {}
@@ -95,7 +130,9 @@ def _get_hosts_from_toml(
     try:
         default_port = _validate_port(int(defaults.get("port", 22)))
     except (ValueError, TypeError):
-        print(f"Warning: Invalid default port in '{toml_file_path}', using 22")
+        messages.append(
+            f"Warning: Invalid default port in '{toml_file_path}', using 22"
+        )
         default_port = 22
 
     default_username: str | None = defaults.get("username")
@@ -106,7 +143,7 @@ def _get_hosts_from_toml(
     if not isinstance(default_tags, list) or not all(
         isinstance(tag, str) for tag in default_tags
     ):
-        print(
+        messages.append(
             f"Warning: Invalid default 'tags' in '{toml_file_path}' "
             "(must be a list of strings). Ignoring default tags."
         )
@@ -115,7 +152,7 @@ def _get_hosts_from_toml(
     try:
         default_timeout = _validate_timeout(float(defaults.get("timeout", 5.0)))
     except (ValueError, TypeError):
-        print(
+        messages.append(
             f"Warning: Invalid default timeout in '{toml_file_path}', using 5.0"
         )
         default_timeout = 5.0
@@ -123,7 +160,7 @@ def _get_hosts_from_toml(
     try:
         default_retries = _validate_retries(int(defaults.get("retries", 2)))
     except (ValueError, TypeError):
-        print(
+        messages.append(
             f"Warning: Invalid default retries in '{toml_file_path}', using 2"
         )
         default_retries = 2
@@ -132,7 +169,7 @@ def _get_hosts_from_toml(
         if host_name == "default":
             continue
         if not isinstance(host_config, dict):
-            print(
+            messages.append(
                 f"Warning: Skipping non-dictionary section '{host_name}' in "
                 f"TOML file '{toml_file_path}'."
             )
@@ -141,18 +178,21 @@ def _get_hosts_from_toml(
         ip_address: str | None = host_config.get("ip")
         # ip_address accepts both IP address and resolvable hostname
         if not ip_address or not isinstance(ip_address, str):
-            print(
+            messages.append(
                 f"Warning: Host '{host_name}' in '{toml_file_path}' is missing "
                 "'ip' or 'ip' is not a string. Skipping!"
             )
             continue
 
         try:
-            port_str = host_config.get("port", default_port)
-            ssh_port = _validate_port(int(port_str))
+            port_value = host_config.get("port", default_port)
+            # TOML integers are used as is, only other values go through int()
+            ssh_port = _validate_port(
+                port_value if type(port_value) is int else int(port_value)
+            )
             username = host_config.get("username", default_username)
             if not username or not isinstance(username, str):
-                print(
+                messages.append(
                     f"Warning: Host '{host_name}' in '{toml_file_path}' is missing "
                     "'username' or 'username' is not a string. Skipping!"
                 )
@@ -163,7 +203,7 @@ def _get_hosts_from_toml(
                     float(host_config.get("timeout", default_timeout))
                 )
             except (ValueError, TypeError):
-                print(
+                messages.append(
                     f"Warning: Invalid timeout for host '{host_name}' in '{toml_file_path}', using {default_timeout}"
                 )
                 timeout = default_timeout
@@ -172,7 +212,7 @@ def _get_hosts_from_toml(
                     int(host_config.get("retries", default_retries))
                 )
             except (ValueError, TypeError):
-                print(
+                messages.append(
                     f"Warning: Invalid retries for host '{host_name}' in '{toml_file_path}', using {default_retries}"
                 )
                 retries = default_retries
@@ -180,7 +220,7 @@ def _get_hosts_from_toml(
             if not isinstance(current_host_tags_list, list) or not all(
                 isinstance(tag, str) for tag in current_host_tags_list
             ):
-                print(
+                messages.append(
                     f"Warning: Host '{host_name}' in '{toml_file_path}' has "
                     "invalid 'tags' (must be a list of strings). Treating as no tags."
                 )
@@ -190,7 +230,7 @@ def _get_hosts_from_toml(
                 current_host_tags_set = set(
                     default_tags + current_host_tags_list
                 )
-            if not active_tags_filter or active_tags_filter.intersection(
+            if not active_tags_filter or not active_tags_filter.isdisjoint(
                 current_host_tags_set
             ):
                 hosts_to_execute.append(
@@ -205,12 +245,12 @@ def _get_hosts_from_toml(
                     )
                 )
         except ValueError:
-            print(
+            messages.append(
                 f"Hosts file (TOML) '{toml_file_path}': Error parsing port for "
                 f"host '{host_name}'. Port must be an integer. Skipping!"
             )
         except Exception as e:
-            print(
+            messages.append(
                 f"Hosts file (TOML) '{toml_file_path}': Unexpected error processing "
                 f"host '{host_name}': {e}. Skipping!"
             )
@@ -227,6 +267,21 @@ def _get_hosts_from_csv(
     """
     Reads hosts from a CSV file and returns a list of tuples with host details.
     """
+    messages: List[str] = []
+    try:
+        return _read_hosts_from_csv(
+            csv_file_path, host_tags_filter_str, messages
+        )
+    finally:
+        _print_messages(messages)
+
+
+def _read_hosts_from_csv(
+    csv_file_path: str, host_tags_filter_str: str | None, messages: List[str]
+) -> Tuple[List[Tuple[str, str, int, str, str, float, int]], int]:
+    """
+    Reads hosts from a CSV file, adding warnings and errors to messages.
+    """
     hosts_to_execute: List[Tuple[str, str, int, str, str, float, int]] = []
     active_tags_filter: Set[str] = (
         set(host_tags_filter_str.split(",")) if host_tags_filter_str else set()
@@ -234,14 +289,26 @@ def _get_hosts_from_csv(
 
     try:
         with open(csv_file_path, "r", encoding="utf-8") as hosts_file_obj:
-            csv_reader = csv.reader(hosts_file_obj)
-            for row_line, row in enumerate(csv_reader, start=1):
-                if not row or row[0].startswith("#"):
+            data = hosts_file_obj.read()
+            rows: Iterable[List[str]]
+            if '"' in data:
+                # Quoted fields may hold commas or newlines, leave the whole
+                # file to the csv module
+                rows = csv.reader(io.StringIO(data))
+            else:
+                # Host rows are plain comma-separated fields
+                rows = [
+                    line.removesuffix("\r").split(",")
+                    for line in data.split("\n")
+                ]
+            for row_line, row in enumerate(rows, start=1):
+                # An empty line is [] from csv.reader and [""] from split
+                if not row or row == [""] or row[0].startswith("#"):
                     continue
 
                 # Check for minimum number of columns before unpacking
                 if len(row) < 4:
-                    print(
+                    messages.append(
                         f"Hosts file (CSV): '{csv_file_path}' row {row_line} is incomplete "
                         "(expected at least 4 columns for name, ip, port, user). Skipping!"
                     )
@@ -256,20 +323,19 @@ def _get_hosts_from_csv(
                     key_path = row[4] if len(row) > 4 else ""
                     tags_in_csv_str = row[5] if len(row) > 5 else ""
                 except ValueError:  # Catches error from int(str_port)
-                    print(
+                    messages.append(
                         f"Hosts file (CSV): '{csv_file_path}' parse error at row {row_line} "
                         "(port must be an integer). Skipping!"
                     )
                     continue
                 # IndexError for key_path or tags_in_csv_str is avoided by conditional access
 
-                current_host_tags_set: Set[str] = (
-                    set(tags_in_csv_str.split(":"))
-                    if tags_in_csv_str
-                    else set()
-                )
-                if not active_tags_filter or active_tags_filter.intersection(
-                    current_host_tags_set
+                # isdisjoint() takes the split tags as is, no set needed
+                if not active_tags_filter or (
+                    tags_in_csv_str
+                    and not active_tags_filter.isdisjoint(
+                        tags_in_csv_str.split(":")
+                    )
                 ):
                     hosts_to_execute.append(
                         (
@@ -283,10 +349,10 @@ def _get_hosts_from_csv(
                         )
                     )
     except FileNotFoundError:
-        print(f"Error: CSV hosts file not found at '{csv_file_path}'")
+        messages.append(f"Error: CSV hosts file not found at '{csv_file_path}'")
         return [], 0
     except Exception as e:
-        print(
+        messages.append(
             f"An unexpected error occurred while reading CSV file '{csv_file_path}': {e}"
         )
         return [], 0
@@ -297,22 +363,71 @@ def _get_hosts_from_csv(
     return [], 0
 
 
-def get_hosts(
-    host_file_path: str, host_tags: str | None
+@lru_cache(maxsize=32)
+def _get_hosts_cached(
+    host_file_path: str, mtime_ns: int, host_tags: str | None
+) -> Tuple[
+    Tuple[Tuple[str, str, int, str, str, float, int], ...], int, Tuple[str, ...]
+]:
+    """
+    Parses the hosts file once per (path, modification time, tags) key.
+    mtime_ns is only part of the key, so an edited file is parsed again.
+    The parse warnings are kept too, to be shown on every call.
+    """
+    messages: List[str] = []
+    hosts, max_name_length = _parse_hosts_file(
+        host_file_path, host_tags, messages
+    )
+    return tuple(hosts), max_name_length, tuple(messages)
+
+
+def _parse_hosts_file(
+    host_file_path: str, host_tags: str | None, messages: List[str]
 ) -> Tuple[List[Tuple[str, str, int, str, str, float, int]], int]:
     """
-    Reads hosts from a file (TOML or CSV) and returns a list of tuples with host details.
+    Dispatches to the TOML or CSV reader based on the file extension.
+    Warnings and errors are added to messages.
     """
-    if not host_file_path:
-        return [], 0
     _root, file_ext = os.path.splitext(host_file_path.lower())
     if file_ext == ".toml":
-        return _get_hosts_from_toml(host_file_path, host_tags)
+        return _read_hosts_from_toml(host_file_path, host_tags, messages)
     elif file_ext == ".csv":
-        return _get_hosts_from_csv(host_file_path, host_tags)
+        return _read_hosts_from_csv(host_file_path, host_tags, messages)
     else:
-        print(
+        messages.append(
             f"Warning: Unknown or missing host file extension for "
             f"'{os.path.basename(host_file_path)}'. Attempting to parse as CSV."
         )
-        return _get_hosts_from_csv(host_file_path, host_tags)
+        return _read_hosts_from_csv(host_file_path, host_tags, messages)
+
+
+def _print_messages(messages: Sequence[str]) -> None:
+    """Write the collected host file messages to stdout in one go."""
+    if messages:
+        sys.stdout.write("\n".join(messages) + "\n")
+
+
+def get_hosts(
+    host_file_path: str, host_tags: str | None
+) -> Tuple[List[Tuple[str, str, int, str, str, float, int]], int]:
+    """
+    Reads hosts from a file (TOML or CSV) and returns a list of tuples with host details.
+    Repeated calls for an unchanged file are served from cache.
+    """
+    if not host_file_path:
+        return [], 0
+    try:
+        file_stat = os.stat(host_file_path)
+    except OSError:
+        # Let the readers report the missing or unreadable file
+        messages: List[str] = []
+        try:
+            return _parse_hosts_file(host_file_path, host_tags, messages)
+        finally:
+            _print_messages(messages)
+    hosts, max_name_length, cached_messages = _get_hosts_cached(
+        host_file_path, file_stat.st_mtime_ns, host_tags
+    )
+    _print_messages(cached_messages)
+    # Hand out a fresh list so callers cannot mutate the cached entry
+    return list(hosts), max_name_length
@@ -1,8 +1,9 @@
 import asyncio
 import re
+from functools import lru_cache
 from itertools import cycle
 from random import shuffle
-from typing import Dict
+from typing import Dict, List, Sequence, Tuple
 
 from . import BLUE, CYAN, GREEN, MAGENTA, RED, RESET, YELLOW
 
@@ -28,6 +29,10 @@ def adjust_cursor_with_prompt(
     line: str, prompt: str, allow_cursor_control: bool, max_name_length: int
 ) -> str:
     """Adjust the cursor control codes to display correctly with Ananta prompt."""
+    # Most lines have no escape sequence or carriage return to adjust
+    if "\x1b" not in line and "\r" not in line:
+        return line.rstrip()
+
     if not allow_cursor_control:
         line = ansi_cursor_control.sub("", line)
     else:
@@ -55,19 +60,23 @@ def adjust_cursor_with_prompt(
 
 def _get_host_color(host_name: str) -> str:
     """Get the color associated with the host name."""
-    if HOST_COLOR.get(host_name) is None:
+    color = HOST_COLOR.get(host_name)
+    if color is None:
         # If the host name is not in the dictionary, assign a new color
-        HOST_COLOR[host_name] = next(COLORS_CYCLE)
-    return HOST_COLOR[host_name]
+        color = HOST_COLOR[host_name] = next(COLORS_CYCLE)
+    return color
 
 
+# A host keeps its color once assigned, so the strings below never change
+@lru_cache(maxsize=256)
 def get_prompt(host_name: str, max_name_length: int, color: bool) -> str:
     """Generate a formatted prompt for displaying the host's name."""
     if color:
-        return f"{_get_host_color(host_name)}[{host_name.rjust(max_name_length)}]{RESET} "
-    return f"[{host_name.rjust(max_name_length)}] "
+        return f"{_get_host_color(host_name)}[{host_name:>{max_name_length}}]{RESET} "
+    return f"[{host_name:>{max_name_length}}] "
 
 
+@lru_cache(maxsize=256)
 def get_end_marker(host_name: str, remote_width: int, color: bool) -> str:
     """Generate an ending line with color matched the host's color."""
     ending_line = "-" * remote_width
@@ -77,44 +86,47 @@ def get_end_marker(host_name: str, remote_width: int, color: bool) -> str:
 
 
 async def print_output(
-    host_name: str,
     max_name_length: int,
     allow_empty_line: bool,
     allow_cursor_control: bool,
     separate_output: bool,
-    print_lock: asyncio.Lock,
-    output_queue: asyncio.Queue,
+    output_queue: asyncio.Queue[Tuple[str, str] | None],
     color: bool,
+    host_names: Sequence[str] = (),
 ):
-    """Print the output from the remote host with the appropriate prompt."""
-    prompt = get_prompt(host_name, max_name_length, color)
-
-    if separate_output:
-        chunks = []
-        while True:
-            output = await output_queue.get()
-            if output is None:
-                break
-            chunks.append(output)
-
-        async with print_lock:
-            for chunk in chunks:
-                for line in chunk.splitlines():
-                    adjusted_line = adjust_cursor_with_prompt(
+    """
+    Print the output from all remote hosts, each line behind its host's
+    prompt. The queue carries (host_name, output) pairs until None.
+    With separate_output, hosts are printed in the order of host_names.
+    """
+    # With separate_output, each host's output is held until the end
+    held_output: Dict[str, List[str]] = {
+        host_name: [] for host_name in host_names
+    }
+
+    def print_lines(host_name: str, output: str) -> None:
+        prompt = get_prompt(host_name, max_name_length, color)
+        # Print the whole chunk in one call, not one write per line
+        lines: List[str] = []
+        for line in output.splitlines():
+            if allow_empty_line or allow_cursor_control or line.strip():
+                lines.append(
+                    adjust_cursor_with_prompt(
                         line, prompt, allow_cursor_control, max_name_length
                     )
-                    if allow_empty_line or allow_cursor_control or line.strip():
-                        print(f"{prompt}{adjusted_line}{RESET}")
-    else:
-        while True:
-            output = await output_queue.get()
-            if output is None:
-                break
-            for line in output.splitlines():
-                adjusted_line = adjust_cursor_with_prompt(
-                    line, prompt, allow_cursor_control, max_name_length
                 )
-                if allow_empty_line or allow_cursor_control or line.strip():
-                    # Synchronize printing of a single line
-                    async with print_lock:
-                        print(f"{prompt}{adjusted_line}{RESET}")
+        if lines:
+            # Each line ends with RESET and the next one starts with prompt
+            line_break = f"{RESET}\n{prompt}"
+            print(f"{prompt}{line_break.join(lines)}{RESET}")
+
+    while (item := await output_queue.get()) is not None:
+        host_name, output = item
+        if separate_output:
+            held_output.setdefault(host_name, []).append(output)
+        else:
+            print_lines(host_name, output)
+
+    for host_name, outputs in held_output.items():
+        for output in outputs:
+            print_lines(host_name, output)
@@ -1,5 +1,11 @@
 import asyncio
 import os
+import platform
+import random
+import weakref
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Mapping, Tuple
 
 import asyncssh
 
@@ -8,6 +14,168 @@ from ananta.output import get_end_marker
 from . import LINES
 
 
+class AdmissionGate:
+    """
+    Admit at most `limit` concurrent holders, like asyncio.Semaphore.
+    Unlike a semaphore, the limit can be changed safely while holders are
+    active or waiting.
+    """
+
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError("AdmissionGate limit must be at least 1")
+        self._limit = limit
+        self._active = 0
+        self._condition = asyncio.Condition()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def locked(self) -> bool:
+        """Return True if entering the gate would wait."""
+        return self._active >= self._limit
+
+    async def set_limit(self, limit: int) -> None:
+        """Change the limit, waking waiters if there is more room now."""
+        if limit < 1:
+            raise ValueError("AdmissionGate limit must be at least 1")
+        async with self._condition:
+            self._limit = limit
+            self._condition.notify_all()
+
+    async def __aenter__(self) -> "AdmissionGate":
+        async with self._condition:
+            try:
+                while self._active >= self._limit:
+                    await self._condition.wait()
+            except asyncio.CancelledError:
+                # Pass on a wakeup this waiter may have consumed
+                if self._active < self._limit:
+                    self._condition.notify(1)
+                raise
+            self._active += 1
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        async with self._condition:
+            self._active -= 1
+            self._condition.notify(1)
+
+
+# Upper bound of concurrent sessions (channels) opened on one connection,
+# matching OpenSSH's default MaxSessions so that sshd never refuses a channel.
+MAX_SESSIONS_PER_CONNECTION = 10
+
+_session_slots: weakref.WeakKeyDictionary[
+    asyncssh.SSHClientConnection, AdmissionGate
+] = weakref.WeakKeyDictionary()
+
+
+def get_session_slots(conn: asyncssh.SSHClientConnection) -> AdmissionGate:
+    """Return the gate limiting concurrent sessions on the connection."""
+    slots = _session_slots.get(conn)
+    if slots is None:
+        slots = AdmissionGate(MAX_SESSIONS_PER_CONNECTION)
+        _session_slots[conn] = slots
+    return slots
+
+
+async def set_max_sessions_per_connection(limit: int) -> None:
+    """Change the session limit for new and already open connections."""
+    global MAX_SESSIONS_PER_CONNECTION
+    MAX_SESSIONS_PER_CONNECTION = limit
+    for slots in list(_session_slots.values()):
+        await slots.set_limit(limit)
+
+
+# Upper bound of concurrent unauthenticated handshakes to one SSH server,
+# kept below sshd's default MaxStartups (10:30:100) so that it never starts
+# dropping connections at random.
+MAX_HANDSHAKES_PER_TARGET = 8
+MAX_RETRY_DELAY = 30.0
+
+# Size of the reads from a streaming command's stdout
+STREAM_CHUNK_SIZE = 65536
+
+# Handshake gates per event loop, as a gate's Condition is bound to the loop
+# it first waits on. Each run (run_cli, the TUI) has its own loop, and its
+# gates go away with it.
+_handshake_slots: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[tuple[str, int], AdmissionGate]
+] = weakref.WeakKeyDictionary()
+
+
+def get_handshake_slots(ip_address: str, ssh_port: int) -> AdmissionGate:
+    """Return the gate limiting concurrent handshakes to the target."""
+    loop_slots = _handshake_slots.setdefault(asyncio.get_running_loop(), {})
+    slots = loop_slots.get((ip_address, ssh_port))
+    if slots is None:
+        slots = AdmissionGate(MAX_HANDSHAKES_PER_TARGET)
+        loop_slots[(ip_address, ssh_port)] = slots
+    return slots
+
+
+def get_retry_delay(attempt: int) -> float:
+    """Return the exponential backoff delay with jitter before a retry."""
+    return min(MAX_RETRY_DELAY, 2**attempt + random.uniform(0, 1))
+
+
+def build_remote_command(ssh_command: str, remote_width: int) -> str:
+    """Prefix the command with the terminal size for the remote process."""
+    # Set through `env` on the remote side rather than asyncssh's env=,
+    # because sshd drops variables not listed in its AcceptEnv (which by
+    # default only allows LANG and LC_*).
+    return f"env COLUMNS={remote_width} LINES={LINES} {ssh_command}"
+
+
+@lru_cache(maxsize=1)
+def has_aes_acceleration() -> bool:
+    """Return whether the CPU is likely to have hardware AES instructions."""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                # x86 reports "flags", ARM reports "Features"
+                if line.startswith(("flags", "Features")):
+                    return "aes" in line.split(":", 1)[-1].split()
+    except OSError:
+        pass
+    # No cpuinfo (macOS, Windows): every x86-64 CPU of the last decade and
+    # Apple silicon have AES instructions
+    return platform.machine().lower() in {"x86_64", "amd64", "arm64"}
+
+
+def get_encryption_algs() -> list[str]:
+    """Return ciphers ordered by expected throughput on this CPU."""
+    aes_gcm = ["aes128-gcm@openssh.com", "aes256-gcm@openssh.com"]
+    chacha = ["chacha20-poly1305@openssh.com"]
+    aes_ctr = ["aes128-ctr", "aes256-ctr"]
+    if has_aes_acceleration():
+        return aes_gcm + chacha + aes_ctr
+    # Without AES instructions, ChaCha20 in software beats table-based AES
+    return chacha + aes_gcm + aes_ctr
+
+
+@lru_cache(maxsize=1)
+def get_preferred_algorithm_options() -> Mapping[str, tuple[str, ...]]:
+    """Return the algorithm options tried first, built once per process."""
+    return MappingProxyType(
+        {
+            "encryption_algs": tuple(get_encryption_algs()),
+            # MACs only apply to the non-AEAD ciphers; prefer encrypt-then-MAC
+            "mac_algs": (
+                "hmac-sha2-256-etm@openssh.com",
+                "hmac-sha2-256",
+                "hmac-sha1",
+            ),
+        }
+    )
+
+
 async def retry_connect(
     ip_address: str,
     ssh_port: int,
@@ -18,33 +186,27 @@ async def retry_connect(
 ) -> asyncssh.SSHClientConnection:
     """Attempt to establish an SSH connection with retries."""
     last_error: asyncssh.Error | asyncio.TimeoutError | None = None
-    algorithm_options = {
-        "encryption_algs": [
-            "aes128-gcm@openssh.com",
-            "aes256-gcm@openssh.com",
-            "chacha20-poly1305@openssh.com",
-            "aes128-ctr",
-            "aes256-ctr",
-        ],
-        "mac_algs": ["hmac-sha2-256", "hmac-sha1"],
-    }  # try with the lowest latency algorithm first
+    # try with the lowest latency algorithm first
+    algorithm_options = get_preferred_algorithm_options()
     for attempt in range(max_retries + 1):
         try:
-            return await asyncio.wait_for(
-                asyncssh.connect(
-                    host=ip_address,
-                    port=ssh_port,
-                    username=username,
-                    client_keys=client_keys,
-                    known_hosts=None,
-                    compression_algs=None,
-                    **algorithm_options,
-                ),
-                timeout=timeout,
-            )
-        except asyncssh.Error as error:
+            # Waiting for a handshake slot does not count toward the timeout
+            async with get_handshake_slots(ip_address, ssh_port):
+                return await asyncio.wait_for(
+                    asyncssh.connect(
+                        host=ip_address,
+                        port=ssh_port,
+                        username=username,
+                        client_keys=client_keys,
+                        known_hosts=None,
+                        compression_algs=None,
+                        **algorithm_options,
+                    ),
+                    timeout=timeout,
+                )
+        except (asyncssh.Error, asyncio.TimeoutError) as error:
             last_error = error
-            _sleep = 1
+            _sleep = get_retry_delay(attempt)
             if (
                 getattr(error, "code", None)
                 == asyncssh.DISC_KEY_EXCHANGE_FAILED
@@ -53,10 +215,6 @@ async def retry_connect(
                 _sleep = 0  # no need to sleep as this is an error on our side
             if attempt < max_retries:
                 await asyncio.sleep(_sleep)
-        except asyncio.TimeoutError as error:
-            last_error = error
-            if attempt < max_retries:
-                await asyncio.sleep(1)
     if isinstance(last_error, asyncio.TimeoutError):
         raise ConnectionError(
             f"Connection to {ip_address} timed out after {timeout}s"
@@ -66,6 +224,29 @@ async def retry_connect(
     ) from last_error
 
 
+@lru_cache(maxsize=1)
+def find_default_ssh_keys() -> tuple[str, ...]:
+    """Find the common SSH keys in ~/.ssh, listing the directory only once."""
+    common_ssh_dir = os.path.expanduser(os.path.join("~", ".ssh"))
+    try:
+        ssh_dir_entries = set(os.listdir(common_ssh_dir))
+    except OSError:
+        ssh_dir_entries = set()
+    # Try to find the available ssh key, in order of preference
+    available_keys = tuple(
+        os.path.join(common_ssh_dir, key)
+        for key in ["id_ed25519", "id_rsa", "id_ecdsa", "id_dsa"]
+        if key in ssh_dir_entries
+    )
+    if not available_keys:
+        # Raising keeps the failure out of the cache, so a key created later
+        # is still picked up
+        raise ConnectionError(
+            "No SSH keys found in ~/.ssh/ and no key specified"
+        )
+    return available_keys
+
+
 def get_ssh_keys(key_path: str | None, default_key: str | None) -> list[str]:
     """Determine SSH keys to use based on provided inputs."""
     # If key path is specified in the hosts file
@@ -75,18 +256,7 @@ def get_ssh_keys(key_path: str | None, default_key: str | None) -> list[str]:
     if default_key:
         return [default_key]
     # If key path is # (not specified) and default key is also not specified via -K
-    common_ssh_dir = os.path.expanduser(os.path.join("~", ".ssh"))
-    common_keys = [
-        os.path.join(common_ssh_dir, key)
-        for key in ["id_ed25519", "id_rsa", "id_ecdsa", "id_dsa"]
-    ]
-    # Try to find the available ssh key
-    available_keys = [key for key in common_keys if os.path.exists(key)]
-    if not available_keys:
-        raise ConnectionError(
-            "No SSH keys found in ~/.ssh/ and no key specified"
-        )
-    return available_keys
+    return list(find_default_ssh_keys())
 
 
 async def establish_ssh_connection(
@@ -104,12 +274,39 @@ async def establish_ssh_connection(
         return await retry_connect(
             ip_address, ssh_port, username, client_keys, timeout, max_retries
         )
+    except ConnectionError:
+        raise  # Already describes the failure, do not wrap it again
     except Exception as error:
         raise ConnectionError(
             f"Error connecting to {ip_address}: {error}"
         ) from error
 
 
+async def _close_connection(conn: asyncssh.SSHClientConnection) -> None:
+    """Close the connection, giving up on waiting after a short while."""
+    if conn.is_closed():
+        return
+    try:
+        conn.close()
+        await asyncio.wait_for(conn.wait_closed(), timeout=2.0)
+    except Exception:
+        pass
+
+
+class _HostOutputQueue:
+    """One host's handle on the output queue shared by all hosts."""
+
+    def __init__(
+        self, queue: asyncio.Queue[Tuple[str, str] | None], host_name: str
+    ):
+        self._queue = queue
+        self._host_name = host_name
+
+    async def put(self, item: str) -> None:
+        """Put the item on the shared queue, tagged with the host name."""
+        await self._queue.put((self._host_name, item))
+
+
 async def execute_command(
     conn: asyncssh.SSHClientConnection,
     ssh_command: str,
@@ -119,16 +316,18 @@ async def execute_command(
     """Execute the given command on the remote host through the SSH connection."""
     output = ""
     try:
-        result = await conn.run(
-            command=f"env COLUMNS={remote_width} LINES={LINES} {ssh_command}",
-            term_type="ansi" if color else "dumb",
-            term_size=(remote_width, LINES),
-            env={},
-        )
-        if isinstance(result.stdout, bytes):
-            output = result.stdout.decode("utf-8")
-        elif isinstance(result.stdout, str):
+        async with get_session_slots(conn):
+            result = await conn.run(
+                command=build_remote_command(ssh_command, remote_width),
+                term_type="ansi" if color else "dumb",
+                term_size=(remote_width, LINES),
+                env={},
+            )
+        # asyncssh decodes to str by default, so check that first
+        if isinstance(result.stdout, str):
             output = result.stdout
+        elif isinstance(result.stdout, bytes):
+            output = result.stdout.decode("utf-8")
         else:
             output = f"Host returns unprintable output, got {type(result.stdout).__name__}"
     except UnicodeDecodeError:
@@ -138,51 +337,98 @@ async def execute_command(
     return output
 
 
+async def run_on(
+    ip_address: str,
+    ssh_port: int,
+    username: str,
+    key_path: str | None,
+    default_key: str | None,
+    ssh_commands: list[str],
+    remote_width: int,
+    color: bool,
+    timeout: float = 5.0,
+    max_retries: int = 2,
+) -> list[str]:
+    """Run the commands one after another over a single connection."""
+    conn = await establish_ssh_connection(
+        ip_address,
+        ssh_port,
+        username,
+        key_path,
+        default_key,
+        timeout,
+        max_retries,
+    )
+    try:
+        return [
+            await execute_command(conn, ssh_command, remote_width, color)
+            for ssh_command in ssh_commands
+        ]
+    finally:
+        await _close_connection(conn)
+
+
 async def stream_command_output(
     conn: asyncssh.SSHClientConnection,
     ssh_command: str,
     remote_width: int,
-    output_queue: asyncio.Queue[str | None],
+    output_queue: asyncio.Queue[str | None] | _HostOutputQueue,
     color: bool,
 ) -> None:
     """Stream the output of the command from the remote host to the output queue."""
-    process = None
-    try:
-        process = await conn.create_process(
-            command=f"env COLUMNS={remote_width} LINES={LINES} {ssh_command}",
-            term_type="ansi" if color else "dumb",
-            term_size=(remote_width, LINES),
-            env={},
-        )
-        async for line in process.stdout:  # type: bytes | str
-            # Put output into the host's output queue
-            if isinstance(line, bytes):
-                try:
-                    await output_queue.put(line.decode("utf-8"))
-                except UnicodeDecodeError as error:
-                    await output_queue.put(
-                        f"Host returns line with bytes that cannot be decoded: {error}"
-                    )
-            elif isinstance(line, str):
-                await output_queue.put(line)
-            else:
-                await output_queue.put(
-                    f"Host returns unprintable line: {repr(line)}"
-                )
-    except asyncssh.Error as error:
-        await output_queue.put(f"Error executing command: {error}")
-    finally:
-        if process:
-            try:
-                process.terminate()  # type: ignore [func-returns-value]
-                await asyncio.wait_for(process.wait(), timeout=5.0)
-            except asyncio.TimeoutError:
-                # If the process doesn't terminate gracefully, force close
-                process.close()  # type: ignore [func-returns-value]
+    async with get_session_slots(conn):
+        process = None
+        pending = ""  # Trailing partial line of the last chunk read
+        try:
+            process = await conn.create_process(
+                command=build_remote_command(ssh_command, remote_width),
+                term_type="ansi" if color else "dumb",
+                term_size=(remote_width, LINES),
+                env={},
+                # Let asyncssh decode each received chunk incrementally
+                # instead of decoding line by line here; undecodable bytes
+                # are replaced rather than aborting the stream.
+                encoding="utf-8",
+                errors="replace",
+            )
+            # Read large chunks rather than paying one await per line in
+            # asyncssh's line iterator; consumers split them into lines
+            while chunk := await process.stdout.read(STREAM_CHUNK_SIZE):
+                # asyncssh decodes to str, so that is the only check on the
+                # common path
+                if not isinstance(chunk, str):
+                    if not isinstance(chunk, bytes):
+                        await output_queue.put(
+                            f"Host returns unprintable line: {repr(chunk)}"
+                        )
+                        continue
+                    # Same treatment asyncssh gives undecodable bytes
+                    chunk = chunk.decode("utf-8", errors="replace")
+                # Put all complete lines of the chunk into the output queue
+                # as one item, keeping the partial last line for later
+                data = pending + chunk
+                cut = data.rfind("\n") + 1
+                if cut:
+                    await output_queue.put(data[:cut])
+                pending = data[cut:]
+            if pending:
+                await output_queue.put(pending)
+        except asyncssh.Error as error:
+            if pending:
+                await output_queue.put(pending)
+            await output_queue.put(f"Error executing command: {error}")
+        finally:
+            if process:
                 try:
-                    await asyncio.wait_for(process.wait(), timeout=2.0)
+                    process.terminate()  # type: ignore [func-returns-value]
+                    await asyncio.wait_for(process.wait(), timeout=5.0)
                 except asyncio.TimeoutError:
-                    pass  # Process didn't close even after force close
+                    # If the process doesn't terminate gracefully, force close
+                    process.close()  # type: ignore [func-returns-value]
+                    try:
+                        await asyncio.wait_for(process.wait(), timeout=2.0)
+                    except asyncio.TimeoutError:
+                        pass  # Process didn't close even after force close
 
 
 async def execute(
@@ -196,13 +442,14 @@ async def execute(
     local_display_width: int,
     separate_output: bool,
     default_key: str | None,
-    output_queue: asyncio.Queue,
+    output_queue: asyncio.Queue[Tuple[str, str] | None],
     color: bool,
     timeout: float,
     max_retries: int,
 ) -> None:
     """Execute the SSH command on the remote host and handle the output."""
     remote_width = local_display_width - max_name_length - 3
+    host_queue = _HostOutputQueue(output_queue, host_name)
     conn = None
 
     try:
@@ -219,26 +466,20 @@ async def execute(
             output = await execute_command(
                 conn, ssh_command, remote_width, color
             )
-            # Put the output into the host's output queue
-            await output_queue.put(output)
+            # Put the output into the shared output queue
+            await host_queue.put(output)
         else:
-            # Stream the output to the host's output queue
+            # Stream the output to the shared output queue
             await stream_command_output(
-                conn, ssh_command, remote_width, output_queue, color
+                conn, ssh_command, remote_width, host_queue, color
             )
     except ConnectionError as error:
-        await output_queue.put(f"Error connecting to {host_name}: {error}")
+        await host_queue.put(f"Error connecting to {host_name}: {error}")
     except RuntimeError as error:
-        await output_queue.put(
-            f"Error executing command on {host_name}: {error}"
-        )
+        await host_queue.put(f"Error executing command on {host_name}: {error}")
     finally:
         # Close the connection if it was established
-        if conn and not conn.is_closed():
-            try:
-                conn.close()
-                await asyncio.wait_for(conn.wait_closed(), timeout=2.0)
-            except (asyncio.TimeoutError, Exception):
-                pass
+        if conn:
+            await _close_connection(conn)
         # Signal end of output once, regardless of success or failure
-        await output_queue.put(get_end_marker(host_name, remote_width, color))
+        await host_queue.put(get_end_marker(host_name, remote_width, color))
@@ -7,22 +7,178 @@ Manages asynchronous SSH connections and command execution on multiple remote ho
 from __future__ import annotations
 
 import asyncio
-from itertools import cycle
-from random import shuffle
-from typing import Any, Dict, List, Set, Tuple
+import time
+from collections import deque
+from functools import lru_cache
+from random import sample
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 import asyncssh
 import urwid
 
+from .. import OUTPUT_QUEUE_SIZE
 from ..config import get_hosts
-from ..ssh import establish_ssh_connection, stream_command_output
-from .ansi import ansi_to_urwid_markup
+from ..ssh import (
+    establish_ssh_connection,
+    set_max_sessions_per_connection,
+    stream_command_output,
+)
+from .ansi import ansi_to_urwid_markup, ansi_to_urwid_markup_with_prefix
+
+# Minimum interval between output-triggered redraws (caps them at 30 fps)
+FRAME_INTERVAL = 1 / 30
+
+# Host prompt colors; darker ones for light theme
+_LIGHT_HOST_COLORS = (
+    "dark red",
+    "dark green",
+    "dark blue",
+    "dark magenta",
+    "dark cyan",
+    "brown",
+    "black",
+)
+# Lighter ones for dark theme (dark colors are not used to avoid confusion
+# with similarity of colors)
+_DARK_HOST_COLORS = (
+    "yellow",
+    "light red",
+    "light green",
+    "light blue",
+    "light magenta",
+    "light cyan",
+)
+
+_HOST_ATTR_TRANSLATION = str.maketrans({"-": "_", " ": "_", ".": "_"})
+
+
+@lru_cache(maxsize=None)
+def _host_attr_name(host_name: str) -> str:
+    """Return the palette attribute name for the host."""
+    return f"host_{host_name.lower().translate(_HOST_ATTR_TRANSLATION)}"
+
+
+def _split_output_lines(output: str) -> List[str]:
+    """
+    Split a chunk of streamed output into lines. Only LF separates lines;
+    a CR is left for the ANSI stripper to handle.
+    """
+    lines = output.split("\n")
+    if len(lines) > 1 and not lines[-1]:
+        lines.pop()  # Nothing follows the final newline
+    return lines
+
+
+class OutputWalker(urwid.ListWalker):
+    """
+    A list walker backed by a bounded deque.
+    Appending past max_lines evicts the oldest line in O(1) instead of
+    shifting the whole list.
+    """
+
+    def __init__(self, max_lines: int | None = None):
+        self._lines: deque[urwid.Widget] = deque(maxlen=max_lines)
+        self._focus = 0
+        self._dirty = False
+
+    @property
+    def max_lines(self) -> int | None:
+        return self._lines.maxlen
+
+    @max_lines.setter
+    def max_lines(self, max_lines: int | None) -> None:
+        """Resize the buffer, keeping the newest lines."""
+        if max_lines == self._lines.maxlen:
+            return
+        evicted = max(0, len(self._lines) - (max_lines or len(self._lines)))
+        self._lines = deque(self._lines, maxlen=max_lines)
+        self._focus = max(0, self._focus - evicted)
+        self._modified()
+
+    def append(self, widget: urwid.Widget, notify: bool = True) -> None:
+        """
+        Append a line, evicting the oldest one when the buffer is full.
+        With notify=False the "modified" signal is deferred until the next
+        flush_modified(), so a burst of lines invalidates the view once.
+        """
+        if len(self._lines) == self._lines.maxlen:
+            # Positions shift down by one; keep the focus on the same line
+            self._focus = max(0, self._focus - 1)
+        self._lines.append(widget)
+        if notify:
+            self._modified()
+        else:
+            self._dirty = True
+
+    def extend(
+        self, widgets: Iterable[urwid.Widget], notify: bool = True
+    ) -> None:
+        """Append several lines at once, signalling "modified" only once."""
+        for widget in widgets:
+            self.append(widget, notify=False)
+        if notify:
+            self.flush_modified()
+
+    def flush_modified(self) -> None:
+        """Emit the "modified" signal deferred by append(notify=False)."""
+        if self._dirty:
+            self._modified()
+
+    def _modified(self) -> None:
+        self._dirty = False
+        super()._modified()
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def __getitem__(self, position: int) -> urwid.Widget:
+        if position < 0:
+            raise IndexError(position)
+        return self._lines[position]
+
+    def __iter__(self) -> Iterator[urwid.Widget]:
+        return iter(self._lines)
+
+    @property
+    def focus(self) -> int | None:
+        return self._focus if self._lines else None
+
+    def set_focus(self, position: int) -> None:
+        if not 0 <= position < len(self._lines):
+            raise IndexError(position)
+        self._focus = position
+        self._modified()
+
+    def next_position(self, position: int) -> int:
+        if position + 1 >= len(self._lines):
+            raise IndexError(position)
+        return position + 1
+
+    def prev_position(self, position: int) -> int:
+        if position <= 0:
+            raise IndexError(position)
+        return position - 1
+
+    def positions(self, reverse: bool = False) -> Iterator[int]:
+        if reverse:
+            return iter(range(len(self._lines) - 1, -1, -1))
+        return iter(range(len(self._lines)))
 
 
 class ListBoxWithScrollBar(urwid.WidgetWrap):
     """A ListBox with a visual scrollbar."""
 
-    def __init__(self, walker: urwid.SimpleFocusListWalker):
+    def __init__(self, walker: OutputWalker | urwid.SimpleFocusListWalker):
         self._walker = walker
         self._list_box = urwid.ListBox(self._walker)
         self._scrollbar = urwid.Text("", align="left")
@@ -33,6 +189,8 @@ class ListBoxWithScrollBar(urwid.WidgetWrap):
             ],
             box_columns=[0],
         )
+        # (height, content length, focus) the scrollbar was last drawn for
+        self._scrollbar_state: Tuple[int, int, int | None] | None = None
         super().__init__(self._wrapped_widget)
 
     def render(
@@ -44,17 +202,22 @@ class ListBoxWithScrollBar(urwid.WidgetWrap):
 
     def _update_scrollbar(self, size: Tuple[int, int]) -> None:
         """Update the scrollbar's appearance based on the list box's state."""
-        max_height = size[1]
-        if max_height <= 0 or not self._walker:
-            self._scrollbar.set_text("")
+        state = (size[1], len(self._walker), self._walker.focus)
+        # set_text() invalidates the scrollbar's cached canvas, so leave it
+        # alone unless the scrollbar would actually look different
+        if state == self._scrollbar_state:
             return
+        self._scrollbar_state = state
+        self._scrollbar.set_text(self._build_scrollbar_text(*state))
 
-        content_length = len(self._walker)
-        if content_length <= max_height:
-            self._scrollbar.set_text("")  # No scrollbar needed
-            return
+    @staticmethod
+    def _build_scrollbar_text(
+        max_height: int, content_length: int, focus_pos: int | None
+    ) -> str:
+        """Return the scrollbar column, one character per row."""
+        if max_height <= 0 or content_length <= max_height:
+            return ""  # No scrollbar needed
 
-        focus_pos = self._walker.focus
         if focus_pos is None or not (0 <= focus_pos < content_length):
             focus_pos = content_length - 1
 
@@ -69,14 +232,12 @@ class ListBoxWithScrollBar(urwid.WidgetWrap):
         scrollable_space = max_height - handle_size
         handle_top = round(scroll_ratio * scrollable_space)
 
-        bar_chars = []
-        for i in range(max_height):
-            if handle_top <= i < handle_top + handle_size:
-                bar_chars.append("█")
-            else:
-                bar_chars.append("░")
-
-        self._scrollbar.set_text("\n".join(bar_chars))
+        bar_chars = (
+            "░" * handle_top
+            + "█" * handle_size
+            + "░" * (max_height - handle_top - handle_size)
+        )
+        return "\n".join(bar_chars)
 
     def keypress(
         self, size: Tuple[int, int] | Tuple[int, ...], key: str
@@ -106,7 +267,7 @@ class ListBoxWithScrollBar(urwid.WidgetWrap):
         return self._list_box.mouse_event(size, event, button, col, row, focus)
 
     @property
-    def body(self) -> urwid.SimpleFocusListWalker:
+    def body(self) -> OutputWalker | urwid.SimpleFocusListWalker:
         """Provide access to the walker for external manipulation."""
         return self._walker
 
@@ -152,63 +313,67 @@ class RefreshingPile(urwid.Pile):
         return result
 
 
+_PaletteEntry = Tuple[str, str, str, None, None, None]
+
+# Default palettes, built once at import rather than on every access
+_LIGHT_DEFAULT_PALETTE: Tuple[_PaletteEntry, ...] = (
+    ("status_ok", "dark green", "default", None, None, None),
+    ("status_error", "dark red", "default", None, None, None),
+    ("status_neutral", "brown", "default", None, None, None),
+    ("command_echo", "dark blue,bold", "default", None, None, None),
+    ("body", "black", "default", None, None, None),
+    ("input_prompt", "dark blue", "default", None, None, None),
+    (
+        "input_prompt_inactive",
+        "light gray",
+        "default",
+        None,
+        None,
+        None,
+    ),
+    ("ansi_bold", "bold", "default", None, None, None),
+    ("ansi_underline", "underline", "default", None, None, None),
+    ("ansi_standout", "standout", "default", None, None, None),
+)
+_DARK_DEFAULT_PALETTE: Tuple[_PaletteEntry, ...] = (
+    ("status_ok", "light green", "default", None, None, None),
+    ("status_error", "light red", "default", None, None, None),
+    ("status_neutral", "yellow", "default", None, None, None),
+    (
+        "command_echo",
+        "light cyan,bold",
+        "default",
+        None,
+        None,
+        None,
+    ),
+    ("body", "white", "default", None, None, None),
+    ("input_prompt", "light blue", "default", None, None, None),
+    (
+        "input_prompt_inactive",
+        "dark gray",
+        "default",
+        None,
+        None,
+        None,
+    ),
+    ("ansi_bold", "bold", "default", None, None, None),
+    ("ansi_underline", "underline", "default", None, None, None),
+    ("ansi_standout", "standout", "default", None, None, None),
+)
+
+
 class AnantaUrwidTUI:
     """Ananta Text User Interface using Urwid."""
 
-    def _get_default_palette(
-        self,
-    ) -> List[Tuple[str, str, str, None, None, None]]:
+    def _get_default_palette(self) -> List[_PaletteEntry]:
         """Return the default palette based on theme."""
         if self.light_theme:
-            return [
-                ("status_ok", "dark green", "default", None, None, None),
-                ("status_error", "dark red", "default", None, None, None),
-                ("status_neutral", "brown", "default", None, None, None),
-                ("command_echo", "dark blue,bold", "default", None, None, None),
-                ("body", "black", "default", None, None, None),
-                ("input_prompt", "dark blue", "default", None, None, None),
-                (
-                    "input_prompt_inactive",
-                    "light gray",
-                    "default",
-                    None,
-                    None,
-                    None,
-                ),
-                ("ansi_bold", "bold", "default", None, None, None),
-                ("ansi_underline", "underline", "default", None, None, None),
-                ("ansi_standout", "standout", "default", None, None, None),
-            ]
-        else:
-            return [
-                ("status_ok", "light green", "default", None, None, None),
-                ("status_error", "light red", "default", None, None, None),
-                ("status_neutral", "yellow", "default", None, None, None),
-                (
-                    "command_echo",
-                    "light cyan,bold",
-                    "default",
-                    None,
-                    None,
-                    None,
-                ),
-                ("body", "white", "default", None, None, None),
-                ("input_prompt", "light blue", "default", None, None, None),
-                (
-                    "input_prompt_inactive",
-                    "dark gray",
-                    "default",
-                    None,
-                    None,
-                    None,
-                ),
-                ("ansi_bold", "bold", "default", None, None, None),
-                ("ansi_underline", "underline", "default", None, None, None),
-                ("ansi_standout", "standout", "default", None, None, None),
-            ]
+            return list(_LIGHT_DEFAULT_PALETTE)
+        return list(_DARK_DEFAULT_PALETTE)
 
     @property
-    def DEFAULT_PALETTE(self) -> List[Tuple[str, str, str, None, None, None]]:
+    def DEFAULT_PALETTE(self) -> List[_PaletteEntry]:
         return self._get_default_palette()
 
     def __init__(
@@ -234,8 +399,11 @@ class AnantaUrwidTUI:
         self.connections: Dict[str, asyncssh.SSHClientConnection | None] = {
             host[0]: None for host in self.hosts
         }
+        # Hosts whose connection is up, kept current by _watch_connection
+        self._live_conns: Set[str] = set()
         self.output_queues: Dict[str, asyncio.Queue[str | None]] = {
-            host[0]: asyncio.Queue() for host in self.hosts
+            host[0]: asyncio.Queue(maxsize=OUTPUT_QUEUE_SIZE)
+            for host in self.hosts
         }
         # --- Urwid setup ---
         self.host_palette_definitions: Dict[
@@ -243,9 +411,12 @@ class AnantaUrwidTUI:
         ] = {}
         self._populate_host_palette_definitions()
         self.current_palette = self._build_palette()
-        self.output_walker: urwid.SimpleFocusListWalker = (
-            urwid.SimpleFocusListWalker([])
-        )
+        # Host prompts never change once max_name_length is known
+        self.host_prompts: Dict[str, List[Tuple[str, str]]] = {
+            host_name: self.format_host_prompt(host_name, self.max_name_length)
+            for host_name, *_ in self.hosts
+        }
+        self.output_walker = OutputWalker(max_lines=24 * 10)
         self.output_box = ListBoxWithScrollBar(self.output_walker)
         self.input_field = urwid.Edit(edit_text="")
         self.prompt_widget = urwid.Text(">>> ")
@@ -271,6 +442,8 @@ class AnantaUrwidTUI:
         self.is_exiting = False
         self.asyncio_loop: asyncio.AbstractEventLoop | None = None
         self.draw_screen_handle: Any = None
+        self._last_draw_ts = 0.0
+        self._scroll_pending = False
         self.shutdown_task: asyncio.Task[None] | None = None
 
         # --- Show the TUI welcome message ---
@@ -305,7 +478,7 @@ class AnantaUrwidTUI:
             )
 
     def _get_host_attr_name(self, host_name: str) -> str:
-        return f"host_{host_name.lower().replace('-', '_').replace(' ', '_').replace('.', '_')}"
+        return _host_attr_name(host_name)
 
     def format_host_prompt(
         self, host_name: str, max_name_length: int
@@ -314,42 +487,29 @@ class AnantaUrwidTUI:
         padded_host = host_name.rjust(max_name_length)
         return [(attr_name, f"[{padded_host}] ")]
 
+    def _get_host_prompt(self, host_name: str) -> List[Tuple[str, str]]:
+        """Return the cached prompt markup for the host."""
+        prompt = self.host_prompts.get(host_name)
+        if prompt is None:
+            prompt = self.format_host_prompt(host_name, self.max_name_length)
+            self.host_prompts[host_name] = prompt
+        return prompt
+
     def _populate_host_palette_definitions(self) -> None:
         """Pre-populates host-specific palette entries."""
-        if self.light_theme:
-            # Use darker colors for light theme
-            URWID_FG_COLORS = [
-                "dark red",
-                "dark green",
-                "dark blue",
-                "dark magenta",
-                "dark cyan",
-                "brown",
-                "black",
-            ]
-            shuffle(URWID_FG_COLORS)  # Shuffle to randomize color assignment
-            COLORS_CYCLE = cycle(
-                URWID_FG_COLORS
-            )  # Create a cycle in case of many hosts
-        else:
-            # Use lighter colors for dark theme (original behavior)
-            URWID_FG_COLORS = [
-                "yellow",
-                "light red",
-                "light green",
-                "light blue",
-                "light magenta",
-                "light cyan",
-            ]  # dark colors are not used to avoid confusion with similarity of colors
-            shuffle(URWID_FG_COLORS)  # Shuffle to randomize color assignment
-            COLORS_CYCLE = cycle(
-                URWID_FG_COLORS
-            )  # Create a cycle in case of many hosts
+        base_colors = (
+            _LIGHT_HOST_COLORS if self.light_theme else _DARK_HOST_COLORS
+        )
+        # Shuffled copy to randomize color assignment per run; indexing
+        # modulo its length wraps around in case of many hosts
+        host_colors = tuple(sample(base_colors, len(base_colors)))
 
         for host_name, *_ in self.hosts:
             attr_name = self._get_host_attr_name(host_name)
             if attr_name not in self.host_palette_definitions:
-                fg_color = next(COLORS_CYCLE)
+                fg_color = host_colors[
+                    len(self.host_palette_definitions) % len(host_colors)
+                ]
                 self.host_palette_definitions[attr_name] = (
                     attr_name,
                     fg_color,
@@ -362,47 +522,63 @@ class AnantaUrwidTUI:
     def _build_palette(self) -> List[Tuple[str | None, ...]]:
         """Build the complete palette for Urwid, including default and host-specific styles."""
         palette = list(self.DEFAULT_PALETTE)
+        defined_names = {entry[0] for entry in palette if entry}
 
-        # Add pre-defined host styles
+        # Add pre-defined host styles unless a default already uses the name
         for host_entry in self.host_palette_definitions.values():
-            # Simple check to avoid adding if somehow already present by name
-            # More robust deduplication happens next anyway
-            if not any(
-                entry[0] == host_entry[0]
-                for entry in palette
-                if entry and entry[0]
-            ):
+            if host_entry[0] not in defined_names:
                 palette.append(host_entry)
+                defined_names.add(host_entry[0])
 
-        seen_names = set()
-        unique_palette: List[Tuple[str | None, ...]] = []
-        for entry in reversed(
-            palette
-        ):  # Iterate from the end to keep last definition of a name
+        # Keep the last definition of each name, in order of appearance
+        unique_entries: Dict[str, Tuple[str | None, ...]] = {}
+        for entry in reversed(palette):
             if isinstance(entry, tuple) and entry[0] is not None:
-                if entry[0] not in seen_names:
-                    unique_palette.insert(0, entry)
-                    seen_names.add(entry[0])
-        return unique_palette
+                unique_entries.setdefault(entry[0], entry)
+        return list(reversed(unique_entries.values()))
 
     def add_output(
-        self, message_parts: List[Any] | str, scroll: bool = True
+        self,
+        message_parts: List[Any] | str,
+        scroll: bool = True,
+        force: bool = False,
     ) -> None:
-        """Add output to the display."""
-        if self.is_exiting and not any(
-            s in str(message_parts).lower()
-            for s in [
-                "exiting",
-                "closed",
-                "cleanup",
-                "shutdown",
-                "processed",
-                "failed",
-                "error",
-            ]
-        ):
+        """
+        Add output to the display.
+        Once exiting, only messages added with force=True are shown.
+        """
+        if self.is_exiting and not force:
+            return
+
+        widget = self._build_output_widget(message_parts)
+        if widget is not None:
+            self._append_widgets([widget], scroll)
+
+    def add_output_lines(
+        self,
+        messages: List[List[Any] | str],
+        scroll: bool = True,
+        force: bool = False,
+    ) -> None:
+        """
+        Add several lines of output to the display in one go.
+        Once exiting, only lines added with force=True are shown.
+        """
+        if self.is_exiting and not force:
             return
 
+        widgets = [
+            widget
+            for message_parts in messages
+            if (widget := self._build_output_widget(message_parts)) is not None
+        ]
+        if widgets:
+            self._append_widgets(widgets, scroll)
+
+    def _build_output_widget(
+        self, message_parts: List[Any] | str
+    ) -> urwid.Text | None:
+        """Build the Text widget for one message, or None to skip it."""
         processed_markup: Any
         if isinstance(message_parts, str):
             processed_markup = ansi_to_urwid_markup(message_parts)
@@ -414,36 +590,57 @@ class AnantaUrwidTUI:
             and isinstance(message_parts, str)
             and message_parts.strip() == ""
         ):
-            widget = urwid.Text("")
+            return urwid.Text("")
         elif not processed_markup:
+            return None
+        return urwid.Text(processed_markup)
+
+    def _append_widgets(
+        self, widgets: Sequence[urwid.Widget], scroll: bool
+    ) -> None:
+        """Append widgets to the output and schedule a redraw."""
+        _, rows = self._get_screen_size()
+        # Keep ten screens of scrollback; the walker evicts the oldest lines
+        self.output_walker.max_lines = rows * 10
+
+        if not (self.loop and self.loop.event_loop):
+            self.output_walker.extend(widgets)
+            if scroll:
+                self.output_walker.set_focus(len(self.output_walker) - 1)
             return
-        else:
-            widget = urwid.Text(processed_markup)
-
-        self.output_walker.append(widget)
-
-        rows: int = 24
-        if self.loop and self.loop.screen:
-            _, rows = self.loop.screen.get_cols_rows()
-        max_lines = rows * 10
-        trim_lines = rows
-        if len(self.output_walker) > max_lines:
-            del self.output_walker[
-                0 : len(self.output_walker) - (max_lines - trim_lines)
-            ]
 
+        # Batch lines arriving within one frame into a single redraw: the
+        # view is invalidated and the focus moved to the bottom only once,
+        # when that frame is drawn.
+        self.output_walker.extend(widgets, notify=False)
         if scroll:
-            self.output_walker.set_focus(len(self.output_walker) - 1)
-
-        if self.loop and self.loop.event_loop and not self.draw_screen_handle:
+            self._scroll_pending = True
+        if not self.draw_screen_handle:
+            delay = FRAME_INTERVAL - (time.monotonic() - self._last_draw_ts)
             self.draw_screen_handle = self.loop.event_loop.alarm(
-                0, self._request_draw
+                max(0.0, delay), self._request_draw
             )
 
+    def _get_screen_size(self) -> Tuple[int, int]:
+        """Return the screen (cols, rows), or (80, 24) without a screen."""
+        if not (self.loop and self.loop.screen):
+            return 80, 24
+        # MainLoop keeps the size it last queried and resets it on window
+        # resize, so the terminal is only asked again after a resize
+        if not self.loop.screen_size:
+            self.loop.screen_size = self.loop.screen.get_cols_rows()
+        return self.loop.screen_size
+
     def _request_draw(self, *_args: Any) -> None:
         """Request a redraw of the screen."""
         try:
+            if self._scroll_pending:
+                self._scroll_pending = False
+                if self.output_walker:
+                    self.output_walker.set_focus(len(self.output_walker) - 1)
+            self.output_walker.flush_modified()
             if self.loop:
+                self._last_draw_ts = time.monotonic()
                 self.loop.draw_screen()
         except BlockingIOError:
             pass  # Ignore if the screen is busy
@@ -464,9 +661,7 @@ class AnantaUrwidTUI:
         if self.is_exiting:
             return
 
-        prompt = self.format_host_prompt(
-            host_name, self.max_name_length
-        )  # No longer needs self.current_palette
+        prompt = self._get_host_prompt(host_name)
         self.add_output(prompt + [("status_neutral", "Connecting...")])
 
         try:
@@ -476,13 +671,27 @@ class AnantaUrwidTUI:
         except Exception as e:
             self.connections[host_name] = None
             self.add_output(
-                prompt + [("status_error", f"Connection failed: {e}")]
+                prompt + [("status_error", f"Connection failed: {e}")],
+                force=True,
             )
         else:
             conn.set_keepalive(interval=30, count_max=3)
             self.connections[host_name] = conn
+            self._live_conns.add(host_name)
+            task = asyncio.create_task(self._watch_connection(host_name, conn))
+            self.async_tasks.add(task)
+            task.add_done_callback(self.async_tasks.discard)
             self.add_output(prompt + [("status_ok", "Connected.")])
 
+    async def _watch_connection(
+        self, host_name: str, conn: asyncssh.SSHClientConnection
+    ) -> None:
+        """Drop a host from the live set once its connection closes."""
+        try:
+            await conn.wait_closed()
+        finally:
+            self._live_conns.discard(host_name)
+
     async def connect_all_hosts(self) -> None:
         """Connect to all hosts defined in the host file."""
         if self.is_exiting:
@@ -526,23 +735,61 @@ class AnantaUrwidTUI:
         self.add_output([("command_echo", f">>> {command}")])
         self.input_field.set_edit_text("")
 
+        name, _, value = command.partition(" ")
+        if name.lower() == "max-sessions":
+            self.set_max_sessions(value.strip())
+            return
+
         for host_name, conn in self.connections.items():
             if self.is_exiting:
                 break
-            if conn and not conn.is_closed():
+            if conn and host_name in self._live_conns:
                 task = asyncio.create_task(
                     self.run_command_on_host(host_name, conn, command)
                 )
                 self.async_tasks.add(task)
                 task.add_done_callback(self.async_tasks.discard)
             else:
-                prompt = self.format_host_prompt(
-                    host_name, self.max_name_length
-                )
+                prompt = self._get_host_prompt(host_name)
                 self.add_output(
                     prompt + [("status_error", "Not connected, skipping.")]
                 )
 
+    def set_max_sessions(self, value: str) -> None:
+        """Change how many commands may run at once on each connection."""
+        try:
+            limit = int(value)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            self.add_output(
+                [("status_error", "Usage: max-sessions <positive number>")]
+            )
+            return
+
+        task = asyncio.create_task(set_max_sessions_per_connection(limit))
+        self.async_tasks.add(task)
+        task.add_done_callback(self.async_tasks.discard)
+        self.add_output(
+            [("status_ok", f"Max sessions per connection set to {limit}.")]
+        )
+
+    def _add_host_lines(
+        self, prompt: List[Tuple[str, str]], lines: List[str]
+    ) -> None:
+        """Add lines of host output, each behind the host prompt."""
+        messages: List[List[Any] | str] = []
+        for line_data in lines:
+            processed_line_markup: List[Any] = ansi_to_urwid_markup_with_prefix(
+                prompt, line_data.rstrip("\r\n")
+            )
+            if processed_line_markup:
+                messages.append(processed_line_markup)
+            elif self.allow_empty_line and line_data.strip() == "":
+                messages.append(prompt + [""])
+        if messages:
+            self.add_output_lines(messages)
+
     async def run_command_on_host(
         self,
         host_name: str,
@@ -553,11 +800,9 @@ class AnantaUrwidTUI:
         if self.is_exiting:  # If exiting, do not run commands
             return
 
-        prompt = self.format_host_prompt(host_name, self.max_name_length)
+        prompt = self._get_host_prompt(host_name)
 
-        cols = 80
-        if self.loop and self.loop.screen:
-            cols = self.loop.screen.get_cols_rows()[0]
+        cols, _ = self._get_screen_size()
         remote_width = (
             max(cols - self.max_name_length - 3, 10) - 1
         )  # Decrease 1 column for the scrollbar.
@@ -571,63 +816,63 @@ class AnantaUrwidTUI:
         )
         self.async_tasks.add(stream_task)
 
+        def put_from_callback(item: str | None) -> None:
+            # The queue is bounded; if it is full, queue the item behind
+            # the pending lines instead of dropping it. The put may never
+            # finish once the reader stops on exit, so it is tracked for
+            # perform_shutdown to cancel.
+            try:
+                output_queue.put_nowait(item)
+            except asyncio.QueueFull:
+                put_task = asyncio.create_task(output_queue.put(item))
+                self.async_tasks.add(put_task)
+                put_task.add_done_callback(self.async_tasks.discard)
+
         def done_cb(task):
             self.async_tasks.discard(task)
             try:
                 exc = task.exception()
                 if exc:
-                    output_queue.put_nowait(
-                        f"Cmd error: {type(exc).__name__} {exc}"
-                    )
+                    put_from_callback(f"Cmd error: {type(exc).__name__} {exc}")
             except asyncio.CancelledError:
                 pass
             except Exception as e:
                 # Should not raise exception from done callback, but be safe
-                output_queue.put_nowait(f"Cmd error: {type(e).__name__} {e}")
-            output_queue.put_nowait(None)
+                put_from_callback(f"Cmd error: {type(e).__name__} {e}")
+            put_from_callback(None)
 
         stream_task.add_done_callback(done_cb)
 
         try:
-            if self.separate_output:
-                collected_output: List[str] = []
-                while not self.is_exiting:
-                    line_data = await output_queue.get()
-                    if line_data is None:
-                        break
-                    collected_output.append(line_data)
-                for line_data in collected_output:
-                    processed_line_markup = ansi_to_urwid_markup(
-                        line_data.rstrip("\r\n")
-                    )
-                    if processed_line_markup:
-                        self.add_output(prompt + processed_line_markup)
-                    elif self.allow_empty_line and line_data.strip() == "":
-                        self.add_output(prompt + [""])
-            else:
-                while not self.is_exiting:
-                    line_data = await output_queue.get()
-                    if line_data is None:
-                        break
-
-                    processed_line_markup = ansi_to_urwid_markup(
-                        line_data.rstrip("\r\n")
-                    )
-                    if processed_line_markup:
-                        self.add_output(prompt + processed_line_markup)
-                    elif (
-                        self.allow_empty_line
-                        and line_data.strip() == ""
-                        and not processed_line_markup
-                    ):
-                        self.add_output(prompt + [""])
+            collected_output: List[str] = []
+            while not self.is_exiting:
+                batch = [await output_queue.get()]
+                # Drain whatever is already buffered, so a burst of output
+                # is added to the walker in one go
+                while batch[-1] is not None and not output_queue.empty():
+                    batch.append(output_queue.get_nowait())
+                finished = batch[-1] is None
+                lines = [
+                    line
+                    for output in batch
+                    if output is not None
+                    for line in _split_output_lines(output)
+                ]
+                if self.separate_output:
+                    collected_output.extend(lines)
+                else:
+                    self._add_host_lines(prompt, lines)
+                if finished:
+                    break
+            if collected_output:
+                self._add_host_lines(prompt, collected_output)
 
         except Exception as e:
-            if not self.is_exiting:
-                self.add_output(
-                    prompt
-                    + [("status_error", f"Cmd error: {type(e).__name__} {e}")]
-                )
+            self.add_output(
+                prompt
+                + [("status_error", f"Cmd error: {type(e).__name__} {e}")],
+                force=True,
+            )
         finally:
             if not stream_task.done():
                 stream_task.cancel()
@@ -690,15 +935,17 @@ class AnantaUrwidTUI:
     async def perform_shutdown(self) -> None:
         """Perform the shutdown process for the TUI."""
         self.add_output(
-            [("status_neutral", "Exiting... Closing connections...")]
+            [("status_neutral", "Exiting... Closing connections...")],
+            force=True,
         )
 
         close_conn_tasks = []
         for host_name, conn in self.connections.items():
             if conn and not conn.is_closed():
                 self.add_output(
-                    self.format_host_prompt(host_name, self.max_name_length)
-                    + [("status_neutral", "Closing...")]
+                    self._get_host_prompt(host_name)
+                    + [("status_neutral", "Closing...")],
+                    force=True,
                 )
                 close_conn_tasks.append(
                     asyncio.create_task(self._close_single_connection(conn))
@@ -707,7 +954,8 @@ class AnantaUrwidTUI:
         if close_conn_tasks:
             await asyncio.gather(*close_conn_tasks, return_exceptions=True)
         self.add_output(
-            [("status_neutral", "All connections closed or timed out.")]
+            [("status_neutral", "All connections closed or timed out.")],
+            force=True,
         )
 
         if self.async_tasks:
@@ -717,7 +965,8 @@ class AnantaUrwidTUI:
                         "status_neutral",
                         f"Cleaning up {len(self.async_tasks)} tasks...",
                     )
-                ]
+                ],
+                force=True,
             )
             for task in list(self.async_tasks):
                 if not task.done():
@@ -726,7 +975,8 @@ class AnantaUrwidTUI:
             self.async_tasks.clear()
 
         self.add_output(
-            [("status_neutral", "Cleanup complete. Ananta TUI will now exit.")]
+            [("status_neutral", "Cleanup complete. Ananta TUI will now exit.")],
+            force=True,
         )
 
         if self.loop and self.loop.event_loop:
@@ -757,10 +1007,16 @@ class AnantaUrwidTUI:
                 ]
             )
 
-    def run(self) -> None:
-        """Run the Ananta TUI main loop."""
+    def run(
+        self,
+        loop_factory: Callable[[], asyncio.AbstractEventLoop] | None = None,
+    ) -> None:
+        """
+        Run the Ananta TUI main loop, on a loop from loop_factory (e.g.
+        uvloop.new_event_loop) if given, else on the default asyncio loop.
+        """
         # Create a new event loop for the TUI
-        self.asyncio_loop = asyncio.new_event_loop()
+        self.asyncio_loop = (loop_factory or asyncio.new_event_loop)()
         asyncio.set_event_loop(self.asyncio_loop)
 
         urwid_event_loop = urwid.AsyncioEventLoop(loop=self.asyncio_loop)
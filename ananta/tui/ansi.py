@@ -1,6 +1,7 @@
 import re
-from dataclasses import dataclass, field
-from typing import List, Tuple
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, List, Sequence, Tuple
 
 import urwid
 
@@ -8,6 +9,28 @@ _DEFAULT_FG_COLOR = "default"  # Urwid's default color string for foreground
 _DEFAULT_BG_COLOR = "default"  # Urwid's default color string for background
 
 
+# Style flags kept in _AnsiState.styles as a bitmask
+_STYLE_BOLD = 1 << 0
+_STYLE_FAINT = 1 << 1
+_STYLE_ITALICS = 1 << 2
+_STYLE_UNDERLINE = 1 << 3
+_STYLE_BLINK = 1 << 4
+_STYLE_REVERSE = 1 << 5
+_STYLE_STANDOUT = 1 << 6
+_STYLE_CONCEAL = 1 << 7
+_STYLE_STRIKETHROUGH = 1 << 8
+
+# Styles that Urwid's AttrSpec parses from the foreground string, by name
+_URWID_STYLES = (
+    (_STYLE_BLINK, "blink"),
+    (_STYLE_BOLD, "bold"),
+    (_STYLE_ITALICS, "italics"),
+    (_STYLE_STANDOUT, "standout"),
+    (_STYLE_STRIKETHROUGH, "strikethrough"),
+    (_STYLE_UNDERLINE, "underline"),
+)
+
+
 @dataclass
 class _AnsiState:
     """Manages the current state of ANSI SGR attributes."""
@@ -15,72 +38,60 @@ class _AnsiState:
     """Initialize the ANSI state with default attributes."""
     fg: str = _DEFAULT_FG_COLOR
     bg: str = _DEFAULT_BG_COLOR
-    styles: set[str] = field(default_factory=set)
+    styles: int = 0  # bitmask of _STYLE_* flags
 
     def reset(self):
         """Reset all attributes to default."""
         self.fg = _DEFAULT_FG_COLOR
         self.bg = _DEFAULT_BG_COLOR
-        self.styles.clear()
+        self.styles = 0
 
     def get_attr_spec(self) -> urwid.AttrSpec:
         """Create an Urwid AttrSpec from the current state."""
-        current_fg_color = self.fg
-        current_bg_color = self.bg
-
-        # Styles that Urwid's AttrSpec parses from the foreground string
-        urwid_supported_styles = {
-            "bold",
-            "underline",
-            "standout",
-            "italics",
-            "blink",
-            "strikethrough",
-        }
-
-        active_style_parts = [
-            s for s in self.styles if s in urwid_supported_styles
-        ]
-
-        # Handle 'reverse' by swapping fg and bg colors
-        if "reverse" in self.styles:
-            current_fg_color, current_bg_color = (
-                current_bg_color,
-                current_fg_color,
-            )
-
-        # Handle 'conceal' by making fg the same as bg
-        if "conceal" in self.styles:
-            current_fg_color = current_bg_color
-
-        # Construct the foreground specification string
-        fg_spec_parts = []
-        if active_style_parts:
-            fg_spec_parts.extend(sorted(active_style_parts))
-
-        if current_fg_color != _DEFAULT_FG_COLOR or not fg_spec_parts:
-            fg_spec_parts.append(current_fg_color)
-
-        final_fg_spec = ",".join(fg_spec_parts)
-        if not final_fg_spec:
-            final_fg_spec = _DEFAULT_FG_COLOR
-
-        final_bg_spec = current_bg_color
-
-        return urwid.AttrSpec(final_fg_spec, final_bg_spec)
-
-
-_ANSI_CONTROL_SEQUENCES = re.compile(
-    r"[\x00-\x08\x0B\x0C\x0E-\x1A\x1C-\x1F]"  # C0 control characters
-    r"[\x80-\x9F]"  # C1 control characters
-    r"\x1bP[^\x1b]*\x1b\\"  # DCS (Device Control String)
-    r"\x1b_[^\x1b]*\x1b\\"  # APC (Application Program Command)
-    r"\x1b\^[^\x1b]*\x1b\\"  # PM (Privacy Message)
+        return _make_attr_spec(self.fg, self.bg, self.styles)
+
+
+@lru_cache(maxsize=1024)
+def _make_attr_spec(fg: str, bg: str, styles: int) -> urwid.AttrSpec:
+    """
+    Build the AttrSpec for the colors and style flags.
+    Cached, as output switches between a handful of attributes.
+    """
+    # Handle 'reverse' by swapping fg and bg colors
+    if styles & _STYLE_REVERSE:
+        fg, bg = bg, fg
+
+    # Handle 'conceal' by making fg the same as bg
+    if styles & _STYLE_CONCEAL:
+        fg = bg
+
+    # Construct the foreground specification string
+    fg_spec_parts = [name for flag, name in _URWID_STYLES if styles & flag]
+
+    if fg != _DEFAULT_FG_COLOR or not fg_spec_parts:
+        fg_spec_parts.append(fg)
+
+    final_fg_spec = ",".join(fg_spec_parts)
+    if not final_fg_spec:
+        final_fg_spec = _DEFAULT_FG_COLOR
+
+    return urwid.AttrSpec(final_fg_spec, bg)
+
+
+# C0 (except TAB, LF, CR and ESC) and C1 control characters
+_CONTROL_CHARACTERS = re.compile(
+    r"[\x00-\x08\x0B\x0C\x0E-\x1A\x1C-\x1F\x80-\x9F]"
 )
-_OSC_CONTROL_SEQUENCES = re.compile(
-    r"\x1b\][^\x07\x1b]*(\x07|\x1b\\)", re.DOTALL
+
+# All escape sequences other than SGR (CSI ending in 'm'), in one pattern so
+# that stripping is a single pass without a callback
+_NON_SGR_ESCAPE_SEQUENCES = re.compile(
+    r"\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)"  # OSC (Operating System Command)
+    r"|\x1b[P_^][^\x1b]*\x1b\\"  # DCS, APC and PM strings
+    # CSI (Control Sequence Introducer): parameter bytes, intermediate bytes
+    # and any final byte but 'm'
+    r"|\x1b\[[\x30-\x3f]*[\x20-\x2f]*[\x40-\x6c\x6e-\x7e]"
 )
-_CSI_CONTROL_SEQUENCES = re.compile(r"(\x1b\[[0-9;?]*)([A-Za-z])")
 
 
 def _strip_ansi_control_sequences(text: str) -> str:
@@ -89,20 +100,18 @@ def _strip_ansi_control_sequences(text: str) -> str:
     Tabs are NOT handled here; they are expanded later on plain text segments.
     Importantly, \x1b (ESC) is NOT stripped by this function if it's part of an SGR.
     """
-    text = _ANSI_CONTROL_SEQUENCES.sub("", text)
-    text = _OSC_CONTROL_SEQUENCES.sub("", text)
+    # Escape sequences all start with ESC; most lines have none. They go
+    # first, as OSC may be terminated by BEL, itself a control character.
+    if "\x1b" in text:
+        text = _NON_SGR_ESCAPE_SEQUENCES.sub("", text)
 
-    # Strip CSI (Control Sequence Introducer) sequences that are NOT SGR (ending in 'm')
-    def csi_stripper(match: re.Match) -> str:
-        if match.group(2) != "m":
-            return ""
-        return match.group(0)
+    text = _CONTROL_CHARACTERS.sub("", text)
 
-    text = _CSI_CONTROL_SEQUENCES.sub(csi_stripper, text)
-
-    if "\r" in text:
-        if not text.endswith("\r") and not text.endswith("\r\n"):
-            text = text.split("\r")[-1]
+    # Keep only the text after the last carriage return, unless the line
+    # ends with one
+    last_cr = text.rfind("\r")
+    if last_cr != -1 and not text.endswith(("\r", "\r\n")):
+        text = text[last_cr + 1 :]
 
     return text
 
@@ -111,51 +120,42 @@ def _expand_tabs_with_col_tracking(
     text: str, starting_col: int, tab_width: int = 8  # default tab width
 ) -> tuple[str, int]:
     """Expands tabs in a string to spaces, tracking column position."""
-    expanded_text = []
-    current_col = starting_col
-    for char in text:
-        if char == "\t":
-            spaces_to_add = tab_width - (current_col % tab_width)
-            expanded_text.append(" " * spaces_to_add)
-            current_col += spaces_to_add
-        else:
-            expanded_text.append(char)
-            current_col += 1
-    return "".join(expanded_text), current_col
+    if "\t" not in text:
+        return text, starting_col + len(text)
+    # str.expandtabs() counts columns from the start of the string; pad the
+    # text to the same tab stop offset and cut the padding off again
+    offset = starting_col % tab_width
+    expanded_text = (" " * offset + text).expandtabs(tab_width)[offset:]
+    return expanded_text, starting_col + len(expanded_text)
 
 
 def _handle_extended_color(
-    params: list[str], idx: int, state: _AnsiState, is_fg: bool
+    params: Sequence[int], idx: int, state: _AnsiState, is_fg: bool
 ) -> int:
     """Handle extended color codes (38;5;n or 38;2;r;g;b for fg, 48 for bg)."""
     if idx >= len(params):
         return idx
     color_mode = params[idx]
     idx += 1
-    if color_mode == "5":
+    if color_mode == 5:
         if idx < len(params):
             color_id = params[idx]
-            try:
-                int(color_id)
+            if color_id >= 0:
                 color_val = f"h{color_id}"
                 if is_fg:
                     state.fg = color_val
                 else:
                     state.bg = color_val
-            except ValueError:
-                pass
             idx += 1
-    elif color_mode == "2":
+    elif color_mode == 2:
         if idx + 2 < len(params):
-            try:
-                r, g, b = params[idx : idx + 3]
-                color_val = f"#{int(r):02x}{int(g):02x}{int(b):02x}"
+            r, g, b = params[idx : idx + 3]
+            if min(r, g, b) >= 0:
+                color_val = f"#{r:02x}{g:02x}{b:02x}"
                 if is_fg:
                     state.fg = color_val
                 else:
                     state.bg = color_val
-            except ValueError:
-                pass
             idx += 3
         else:
             # Malformed sequence, consume rest of params to avoid misinterpretation.
@@ -164,138 +164,214 @@ def _handle_extended_color(
 
 
 _ANSI_SGR_PATTERN = re.compile(r"\x1b\[([\d;]*)m")
-_ANSI_FG_COLOR_MAP = {
-    "30": "black",
-    "31": "dark red",
-    "32": "dark green",
-    "33": "brown",
-    "34": "dark blue",
-    "35": "dark magenta",
-    "36": "dark cyan",
-    "37": "light gray",
-    "90": "dark gray",
-    "91": "light red",
-    "92": "light green",
-    "93": "yellow",
-    "94": "light blue",
-    "95": "light magenta",
-    "96": "light cyan",
-    "97": "white",
-}
-_ANSI_BG_COLOR_MAP = {
-    "40": "black",
-    "41": "dark red",
-    "42": "dark green",
-    "43": "brown",
-    "44": "dark blue",
-    "45": "dark magenta",
-    "46": "dark cyan",
-    "47": "light gray",
-    "100": "dark gray",
-    "101": "light red",
-    "102": "light green",
-    "103": "yellow",
-    "104": "light blue",
-    "105": "light magenta",
-    "106": "light cyan",
-    "107": "white",
+
+_ANSI_BASE_COLORS = (
+    "black",
+    "dark red",
+    "dark green",
+    "brown",
+    "dark blue",
+    "dark magenta",
+    "dark cyan",
+    "light gray",
+)
+_ANSI_BRIGHT_COLORS = (
+    "dark gray",
+    "light red",
+    "light green",
+    "yellow",
+    "light blue",
+    "light magenta",
+    "light cyan",
+    "white",
+)
+
+# Color tables indexed directly by SGR code; "" means "not a color code".
+_ANSI_FG_COLORS: tuple[str, ...] = (
+    ("",) * 30 + _ANSI_BASE_COLORS + ("",) * 52 + _ANSI_BRIGHT_COLORS
+) + ("",) * 10
+_ANSI_BG_COLORS: tuple[str, ...] = (
+    ("",) * 40 + _ANSI_BASE_COLORS + ("",) * 52 + _ANSI_BRIGHT_COLORS
+)
+
+# SGR style codes mapped to (style flags to set, style flags to clear)
+_ANSI_STYLE_CODES: dict[int, tuple[int, int]] = {
+    1: (_STYLE_BOLD, 0),
+    2: (_STYLE_FAINT, 0),
+    3: (_STYLE_ITALICS, 0),
+    4: (_STYLE_UNDERLINE, 0),
+    5: (_STYLE_BLINK, 0),
+    6: (_STYLE_BLINK, 0),
+    7: (_STYLE_REVERSE | _STYLE_STANDOUT, 0),
+    8: (_STYLE_CONCEAL, 0),
+    9: (_STYLE_STRIKETHROUGH, 0),
+    21: (_STYLE_UNDERLINE, 0),
+    22: (0, _STYLE_BOLD | _STYLE_FAINT),
+    23: (0, _STYLE_ITALICS),
+    24: (0, _STYLE_UNDERLINE),
+    25: (0, _STYLE_BLINK),
+    27: (0, _STYLE_REVERSE | _STYLE_STANDOUT),
+    28: (0, _STYLE_CONCEAL),
+    29: (0, _STYLE_STRIKETHROUGH),
 }
 
 
+@lru_cache(maxsize=512)
+def _parse_sgr_params(codes_str: str) -> tuple[int, ...]:
+    """
+    Parse SGR parameters to ints, using -1 for empty parameters.
+    Cached, as output tends to repeat a handful of sequences.
+    """
+    return tuple(int(code) if code else -1 for code in codes_str.split(";"))
+
+
+# An SGR handler applies one code to the state and returns the index of the
+# next parameter to read (extended colors consume extra parameters).
+_SgrHandler = Callable[[_AnsiState, Sequence[int], int], int]
+
+
+def _reset_handler(state: _AnsiState, params: Sequence[int], idx: int) -> int:
+    state.reset()
+    return idx
+
+
+def _fg_handler(color: str) -> _SgrHandler:
+    def handler(state: _AnsiState, params: Sequence[int], idx: int) -> int:
+        state.fg = color
+        return idx
+
+    return handler
+
+
+def _bg_handler(color: str) -> _SgrHandler:
+    def handler(state: _AnsiState, params: Sequence[int], idx: int) -> int:
+        state.bg = color
+        return idx
+
+    return handler
+
+
+def _style_handler(added: int, removed: int) -> _SgrHandler:
+    kept = ~removed
+
+    def handler(state: _AnsiState, params: Sequence[int], idx: int) -> int:
+        state.styles = (state.styles & kept) | added
+        return idx
+
+    return handler
+
+
+def _extended_color_handler(is_fg: bool) -> _SgrHandler:
+    def handler(state: _AnsiState, params: Sequence[int], idx: int) -> int:
+        return _handle_extended_color(params, idx, state, is_fg)
+
+    return handler
+
+
+def _build_sgr_handlers() -> tuple[_SgrHandler | None, ...]:
+    """Build the jump table from SGR code to its handler."""
+    handlers: list[_SgrHandler | None] = [None] * 108
+    handlers[0] = _reset_handler
+    for code, (added, removed) in _ANSI_STYLE_CODES.items():
+        handlers[code] = _style_handler(added, removed)
+    for code in range(108):
+        if _ANSI_FG_COLORS[code]:
+            handlers[code] = _fg_handler(_ANSI_FG_COLORS[code])
+        elif _ANSI_BG_COLORS[code]:
+            handlers[code] = _bg_handler(_ANSI_BG_COLORS[code])
+    handlers[39] = _fg_handler(_DEFAULT_FG_COLOR)
+    handlers[49] = _bg_handler(_DEFAULT_BG_COLOR)
+    handlers[38] = _extended_color_handler(True)
+    handlers[48] = _extended_color_handler(False)
+    return tuple(handlers)
+
+
+_SGR_HANDLERS = _build_sgr_handlers()
+
+
+def _apply_sgr_params(params: Sequence[int], state: _AnsiState) -> None:
+    """Apply a list of integer SGR parameters to the ANSI state."""
+    idx = 0
+    num_params = len(params)
+    while idx < num_params:
+        code = params[idx]
+        idx += 1
+        # do nothing for empty, unsupported or unrecognized codes
+        if 0 <= code < 108 and (handler := _SGR_HANDLERS[code]) is not None:
+            idx = handler(state, params, idx)
+
+
+# Longer lines are unlikely to repeat and not worth hashing
+_MARKUP_CACHE_MAX_LEN = 256
+
+
 def ansi_to_urwid_markup(line: str) -> List[Tuple[urwid.AttrSpec, str] | str]:
     """
     Convert a string containing ANSI SGR codes to Urwid markup list.
     Non-SGR control codes are stripped, and tabs are expanded.
+    Short colored lines are memoized, since the same command on many hosts
+    tends to print the same lines.
     """
-    cleaned_line = _strip_ansi_control_sequences(line)
+    return ansi_to_urwid_markup_with_prefix((), line)
 
-    markup: List[Tuple[urwid.AttrSpec, str] | str] = []
-    last_pos = 0
-    current_col = 0
-    state = _AnsiState()
 
-    for match in _ANSI_SGR_PATTERN.finditer(cleaned_line):
-        start, end = match.span()
+def ansi_to_urwid_markup_with_prefix(
+    prefix: Sequence[Tuple[Any, str] | str], line: str
+) -> List[Tuple[urwid.AttrSpec, str] | str]:
+    """
+    Convert a line like ansi_to_urwid_markup, with the markup starting with
+    the prefix, e.g. a host prompt. Builds the list once instead of
+    prepending to it. Returns an empty list if the line has no text.
+    """
+    if len(line) <= _MARKUP_CACHE_MAX_LEN and "\x1b" in line:
+        cached_markup = _cached_ansi_to_markup(line)
+        return [*prefix, *cached_markup] if cached_markup else []
+    return _ansi_to_markup(line, prefix)
+
 
-        if start > last_pos:
-            text_segment = cleaned_line[last_pos:start]
-            expanded_segment, new_col = _expand_tabs_with_col_tracking(
-                text_segment, current_col
-            )
-            current_col = new_col
-            if expanded_segment:
-                markup.append((state.get_attr_spec(), expanded_segment))
+@lru_cache(maxsize=256)
+def _cached_ansi_to_markup(
+    line: str,
+) -> Tuple[Tuple[urwid.AttrSpec, str] | str, ...]:
+    return tuple(_ansi_to_markup(line))
 
-        last_pos = end
 
-        codes_str = match.group(1)
-        if not codes_str or codes_str == "0":
-            state.reset()
-        else:
-            params = codes_str.split(";")
-            idx = 0
-            while idx < len(params):
-                code = params[idx]
-                if not code:
-                    idx += 1
-                    continue
-                # turn off black formatting to make code more readable
-                # fmt: off
-                match code:
-                    # add, update, or remove styles based on ANSI codes 
-                    case "1": state.styles.add("bold")
-                    case "2": state.styles.add("faint")
-                    case "3": state.styles.add("italics")
-                    case "4": state.styles.add("underline")
-                    case "5" | "6": state.styles.add("blink")
-                    case "7": state.styles.update({"reverse", "standout"})
-                    case "8": state.styles.add("conceal")
-                    case "9": state.styles.add("strikethrough")
-                    case "21": state.styles.add("underline")
-                    case "22": state.styles.difference_update({"bold", "faint"})
-                    case "23": state.styles.discard("italics")
-                    case "24": state.styles.discard("underline")
-                    case "25": state.styles.discard("blink")
-                    case "27": state.styles.difference_update({"reverse", "standout"})
-                    case "28": state.styles.discard("conceal")
-                    case "29": state.styles.discard("strikethrough")
-                    # foreground and background color codes
-                    case code if code in _ANSI_FG_COLOR_MAP:
-                        state.fg = _ANSI_FG_COLOR_MAP[code]
-                    case "39":
-                        state.fg = _DEFAULT_FG_COLOR
-                    case code if code in _ANSI_BG_COLOR_MAP:
-                        state.bg = _ANSI_BG_COLOR_MAP[code]
-                    case "49":
-                        state.bg = _DEFAULT_BG_COLOR
-                    # extended color codes
-                    case "38":
-                        idx = _handle_extended_color(
-                            params, idx + 1, state, True
-                        )
-                        continue
-                    case "48":
-                        idx = _handle_extended_color(
-                            params, idx + 1, state, False
-                        )
-                        continue
-                    # do nothing for unsupported or unrecognized codes
-                    case _:
-                        pass
-                # fmt: on
-                # turn on black formatting
-                idx += 1
-
-    if last_pos < len(cleaned_line):
-        text_segment = cleaned_line[last_pos:]
-        expanded_segment, _ = _expand_tabs_with_col_tracking(
+def _ansi_to_markup(
+    line: str, prefix: Sequence[Tuple[Any, str] | str] = ()
+) -> List[Tuple[urwid.AttrSpec, str] | str]:
+    cleaned_line = _strip_ansi_control_sequences(line)
+
+    # Fast path: most output lines carry no escape sequences at all
+    if "\x1b" not in cleaned_line:
+        if "\t" in cleaned_line:
+            cleaned_line, _ = _expand_tabs_with_col_tracking(cleaned_line, 0)
+        if not cleaned_line:
+            return []
+        return [*prefix, (_AnsiState().get_attr_spec(), cleaned_line)]
+
+    markup: List[Tuple[urwid.AttrSpec, str] | str] = [*prefix]
+    current_col = 0
+    state = _AnsiState()
+
+    def emit(text_segment: str) -> None:
+        nonlocal current_col
+        expanded_segment, current_col = _expand_tabs_with_col_tracking(
             text_segment, current_col
         )
         if expanded_segment:
             markup.append((state.get_attr_spec(), expanded_segment))
 
-    return [
-        part
-        for part in markup
-        if isinstance(part, str) or (isinstance(part, tuple) and part[1])
-    ]
+    # split() alternates text and SGR parameters: [text, params, text, ...]
+    parts = _ANSI_SGR_PATTERN.split(cleaned_line)
+    for idx in range(0, len(parts) - 1, 2):
+        if parts[idx]:
+            emit(parts[idx])
+        codes_str = parts[idx + 1]
+        if not codes_str or codes_str == "0":
+            state.reset()
+        else:
+            _apply_sgr_params(_parse_sgr_params(codes_str), state)
+    if parts[-1]:
+        emit(parts[-1])
+
+    return markup if len(markup) > len(prefix) else []
@@ -0,0 +1,51 @@
+import asyncio
+import logging
+from unittest.mock import MagicMock
+
+import pytest
+import pytest_asyncio
+
+from ananta.tui import OutputWalker
+
+# Longest an event loop callback may run before it counts as blocking;
+# debug mode and mock setup alone take a few milliseconds per step
+BLOCKING_THRESHOLD = 0.05
+
+
+@pytest_asyncio.fixture
+async def no_blocking_calls(caplog):
+    """Fail the test if any event loop callback blocks for too long.
+
+    Uses asyncio debug mode, which logs every callback that runs longer
+    than ``slow_callback_duration``, e.g. synchronous file I/O in a
+    coroutine.
+    """
+    loop = asyncio.get_running_loop()
+    debug = loop.get_debug()
+    loop.set_debug(True)
+    loop.slow_callback_duration = BLOCKING_THRESHOLD
+    with caplog.at_level(logging.WARNING, logger="asyncio"):
+        yield
+    loop.set_debug(debug)
+    blocking = [
+        record.getMessage()
+        for record in caplog.get_records("call")
+        if record.name == "asyncio"
+        and record.getMessage().startswith("Executing ")
+    ]
+    if blocking:
+        pytest.fail("Blocking call in event loop: " + "; ".join(blocking))
+
+
+@pytest.fixture
+def mock_output_walker():
+    """A mocked OutputWalker whose extend() goes through append().
+
+    Lets TUI tests check every added line on ``append`` alone, like the
+    real walker batching lines into one update.
+    """
+    walker = MagicMock(spec=OutputWalker)
+    walker.extend.side_effect = lambda widgets, notify=True: [
+        walker.append(w, notify=notify) for w in widgets
+    ]
+    return walker
@@ -1,95 +1,112 @@
-import builtins
 import importlib
 import os
 import sys
-from unittest.mock import AsyncMock, MagicMock, patch
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, call, patch
+
+import pytest
 
 # ananta.ananta module, to be reloaded in some tests
 import ananta.ananta as ananta_module
-from ananta.ananta import run_cli
+from ananta.ananta import MAX_CONCURRENT_HOSTS, run_cli
 
 
-@patch(
-    "ananta.ananta.main", new_callable=AsyncMock
-)  # Mock main to prevent full execution
-@patch("ananta.ananta.argparse.ArgumentParser.parse_args")
-@patch("ananta.ananta.asyncio.set_event_loop_policy")
-@patch("sys.platform", "linux")
-def test_run_cli_uvloop_linux_success(
-    mock_set_policy, mock_parse_args, mock_main_func
-):
-    mock_parse_args.return_value = MagicMock(
+def fake_event_loop():
+    """Stand-in for uvloop/winloop.new_event_loop; never called in tests."""
+    raise AssertionError("the event loop should not be created")
+
+
+# A plain stand-in for the uvloop/winloop module. It has no install(), so
+# run_cli calling it fails the test.
+FAKE_LOOP_MODULE = SimpleNamespace(new_event_loop=fake_event_loop)
+
+
+def make_args(**overrides):
+    """Build parsed CLI arguments, defaulting to a plain non-TUI run."""
+    args = dict(
         host_file="hosts.csv",
         command=["cmd"],
         version=False,
         terminal_width=80,
         tui=False,
         tui_light=False,
+        no_color=False,
+        separate_output=False,
+        host_tags=None,
+        allow_empty_line=False,
+        allow_cursor_control=False,
+        default_key=None,
+        max_concurrency=MAX_CONCURRENT_HOSTS,
     )
-    # Simulate uvloop being successfully imported and set in ananta_module.uvloop
-    with patch.dict(
-        sys.modules, {"uvloop": MagicMock(EventLoopPolicy=MagicMock())}
-    ):
-        # Reload ananta_module to re-trigger its module-level uvloop import logic
-        # This is tricky because ananta_module.uvloop is what ananta.ananta.run_cli checks
-        # For this test, we'll patch ananta_module.uvloop directly to simulate successful import
-        with patch(
-            "ananta.ananta.uvloop", MagicMock(EventLoopPolicy=MagicMock())
-        ) as mock_uvloop_module:
-            run_cli()
-            mock_set_policy.assert_called_once_with(
-                mock_uvloop_module.EventLoopPolicy()
-            )
+    args.update(overrides)
+    return SimpleNamespace(**args)
+
+
+def close_main_coroutine(mock_runner):
+    """Make a patched asyncio.Runner close the main() coroutine it runs."""
+    runner = mock_runner.return_value.__enter__.return_value
+    runner.run.side_effect = lambda coro: coro.close()
+
+
+@patch(
+    "ananta.ananta.main", new_callable=AsyncMock
+)  # Mock main to prevent full execution
+@patch("ananta.ananta.argparse.ArgumentParser.parse_args")
+@patch("ananta.ananta.asyncio.Runner")
+@patch("sys.platform", "linux")
+def test_run_cli_uvloop_linux_success(
+    mock_runner, mock_parse_args, mock_main_func
+):
+    mock_parse_args.return_value = make_args()
+    close_main_coroutine(mock_runner)
+    # Simulate uvloop being successfully imported
+    with patch("ananta.ananta.uvloop", FAKE_LOOP_MODULE):
+        run_cli()
+        mock_runner.assert_called_once_with(loop_factory=fake_event_loop)
 
 
 @patch("ananta.ananta.main", new_callable=AsyncMock)
 @patch("ananta.ananta.argparse.ArgumentParser.parse_args")
-@patch("ananta.ananta.asyncio.set_event_loop_policy")
+@patch("ananta.ananta.asyncio.Runner")
 @patch("sys.platform", "linux")
 def test_run_cli_uvloop_linux_fail(
-    mock_set_policy, mock_parse_args, mock_main_func
+    mock_runner, mock_parse_args, mock_main_func
 ):
-    mock_parse_args.return_value = MagicMock(
-        host_file="hosts.csv",
-        command=["cmd"],
-        version=False,
-        terminal_width=80,
-        tui=False,
-        tui_light=False,
-    )
+    mock_parse_args.return_value = make_args()
+    close_main_coroutine(mock_runner)
     # Simulate uvloop being None (import failed)
     with patch("ananta.ananta.uvloop", None):
         run_cli()
-        mock_set_policy.assert_not_called()
+        mock_runner.assert_called_once_with(loop_factory=None)
 
 
 @patch("ananta.ananta.main", new_callable=AsyncMock)
 @patch("ananta.ananta.argparse.ArgumentParser.parse_args")
-@patch("ananta.ananta.asyncio.set_event_loop_policy")
+@patch("ananta.ananta.asyncio.Runner")
 @patch("sys.platform", "win32")
 def test_run_cli_winloop_windows_success(
-    mock_set_policy, mock_parse_args, mock_main_func
+    mock_runner, mock_parse_args, mock_main_func
 ):
-    mock_parse_args.return_value = MagicMock(
-        host_file="hosts.csv",
-        command=["cmd"],
-        version=False,
-        terminal_width=80,
-        tui=False,
-        tui_light=False,
-    )
-    # Simulate winloop being successfully imported and set in ananta_module.uvloop
-    with patch.dict(
-        sys.modules, {"winloop": MagicMock(EventLoopPolicy=MagicMock())}
-    ):
-        # Patch ananta_module.uvloop directly to simulate successful import of winloop
-        with patch(
-            "ananta.ananta.uvloop", MagicMock(EventLoopPolicy=MagicMock())
-        ) as mock_winloop_module:  # ananta.ananta.uvloop will point to winloop
-            run_cli()
-            mock_set_policy.assert_called_once_with(
-                mock_winloop_module.EventLoopPolicy()
-            )
+    mock_parse_args.return_value = make_args()
+    close_main_coroutine(mock_runner)
+    # Simulate winloop being successfully imported
+    with patch("ananta.ananta.uvloop", FAKE_LOOP_MODULE):
+        run_cli()
+        mock_runner.assert_called_once_with(loop_factory=fake_event_loop)
+
+
+@patch("ananta.ananta.main", new_callable=AsyncMock)
+@patch("ananta.ananta.argparse.ArgumentParser.parse_args")
+@patch("ananta.ananta.asyncio.run")
+@patch("ananta.ananta.sys.version_info", (3, 10))
+def test_run_cli_uvloop_python310(mock_run, mock_parse_args, mock_main_func):
+    """Test that Python 3.10, without asyncio.Runner, installs uvloop."""
+    mock_parse_args.return_value = make_args()
+    mock_run.side_effect = lambda coro: coro.close()
+    with patch("ananta.ananta.uvloop") as mock_uvloop_module:
+        run_cli()
+        mock_uvloop_module.install.assert_called_once()
+        mock_run.assert_called_once()
 
 
 @patch("ananta.ananta.main", new_callable=AsyncMock)  # Mock main
@@ -99,14 +116,7 @@ def test_run_cli_winloop_windows_success(
 def test_run_cli_terminal_width_from_os_get_terminal_size(
     mock_get_terminal_size, mock_parse_args, mock_main_func
 ):
-    mock_parse_args.return_value = MagicMock(
-        host_file="hosts.csv",
-        command=["cmd"],
-        version=False,
-        terminal_width=None,
-        tui=False,
-        tui_light=False,
-    )
+    mock_parse_args.return_value = make_args(terminal_width=None)
     mock_get_terminal_size.return_value = os.terminal_size(
         (120, 24)
     )  # Simulate terminal size
@@ -127,16 +137,8 @@ def test_run_cli_terminal_width_from_os_get_terminal_size(
 def test_run_cli_terminal_width_from_env_columns(
     mock_os_get_terminal_size, mock_parse_args, mock_main_func
 ):
-    mock_parse_args.return_value = MagicMock(
-        host_file="hosts.csv",
-        command=["cmd"],
-        version=False,
-        terminal_width=None,
-        tui=False,
-        tui_light=False,
-    )
+    mock_parse_args.return_value = make_args(terminal_width=None)
 
-    # os.get_terminal_size() WILL be called to prepare the default for os.environ.get()
     # Let it return a dummy value different from 100 to ensure it's not the source of the width.
     mock_os_get_terminal_size.return_value = os.terminal_size((50, 24))
 
@@ -145,25 +147,34 @@ def test_run_cli_terminal_width_from_env_columns(
     args_call, kwargs_call = mock_main_func.call_args  # noqa
     # The crucial part: local_display_width should be 100 (from COLUMNS), not 50 (from mocked get_terminal_size)
     assert args_call[2] == 100
+    # With COLUMNS set, run_cli does not query the terminal itself (argparse's
+    # help formatter still asks shutil for the size of stdout)
+    assert call() not in mock_os_get_terminal_size.call_args_list
 
 
 @patch("ananta.ananta.main", new_callable=AsyncMock)  # Mock main
 @patch("ananta.ananta.argparse.ArgumentParser.parse_args")
 def test_run_cli_terminal_width_from_arg(mock_parse_args, mock_main_func):
-    mock_parse_args.return_value = MagicMock(
-        host_file="hosts.csv",
-        command=["cmd"],
-        version=False,
-        terminal_width=90,
-        tui=False,
-        tui_light=False,
-    )
+    mock_parse_args.return_value = make_args(terminal_width=90)
 
     run_cli()
     args, kwargs = mock_main_func.call_args  # noqa
     assert args[2] == 90  # local_display_width from args.terminal_width
 
 
+@patch("ananta.ananta.main", new_callable=AsyncMock)  # Mock main
+@patch("ananta.ananta.argparse.ArgumentParser.parse_args")
+def test_run_cli_max_concurrency(mock_parse_args, mock_main_func):
+    mock_parse_args.return_value = make_args(max_concurrency=4)
+    run_cli()
+    args, kwargs = mock_main_func.call_args  # noqa
+    assert args[9] == 4
+
+    mock_parse_args.return_value = make_args(max_concurrency=0)
+    with pytest.raises(SystemExit):
+        run_cli()
+
+
 @patch("ananta.ananta.main", new_callable=AsyncMock)  # Mock main
 @patch("ananta.ananta.argparse.ArgumentParser.parse_args")
 @patch("os.get_terminal_size", side_effect=OSError("Simulated OSError"))
@@ -171,56 +182,49 @@ def test_run_cli_terminal_width_from_arg(mock_parse_args, mock_main_func):
 def test_run_cli_terminal_width_os_error(
     mock_get_terminal_size, mock_parse_args, mock_main_func
 ):
-    mock_parse_args.return_value = MagicMock(
-        host_file="hosts.csv",
-        command=["cmd"],
-        version=False,
-        terminal_width=None,
-        tui=False,
-        tui_light=False,
-    )
+    mock_parse_args.return_value = make_args(terminal_width=None)
 
     run_cli()
     args, kwargs = mock_main_func.call_args  # noqa
     assert args[2] == 80  # Default width on OSError
 
 
-@patch("ananta.ananta.asyncio.set_event_loop_policy")
-def test_run_cli_platform_imports(mock_set_event_loop_policy, capsys, tmp_path):
-    args = MagicMock(
-        host_file=str(tmp_path / "hosts.csv"),
-        command=["cmd"],
-        version=False,
-        terminal_width=80,
-        no_color=False,
-        separate_output=False,
-        host_tags=None,
-        allow_empty_line=False,
-        allow_cursor_control=False,
-        default_key=None,
-        tui=False,
-        tui_light=False,
-    )
+@pytest.mark.parametrize(
+    "platform, loop_module_name, gil_enabled",
+    [
+        ("linux", "uvloop", True),  # Linux, uvloop success
+        ("win32", "winloop", True),  # Windows, winloop success
+        ("linux", None, True),  # Linux, uvloop import fail
+        ("linux", "uvloop", False),  # Free-threaded build, import skipped
+    ],
+)
+@patch("asyncio.Runner")
+def test_run_cli_platform_imports(
+    mock_runner, platform, loop_module_name, gil_enabled, tmp_path
+):
+    args = make_args(host_file=str(tmp_path / "hosts.csv"))
     (tmp_path / "hosts.csv").write_text(
         "host1,1.1.1.1,22,user,#", encoding="utf-8"
     )
-
-    original_ananta_uvloop = ananta_module.uvloop
-    original_sys_modules = sys.modules.copy()
-    _original_builtins_import = builtins.__import__  # Save original __import__
-
-    # Scenario 1: Linux, uvloop success
-    with patch("sys.platform", "linux"):
-        mock_uvloop_module = MagicMock(EventLoopPolicy=MagicMock())
-        sys.modules["uvloop"] = mock_uvloop_module
-        if "winloop" in sys.modules:
-            del sys.modules["winloop"]
-
-        try:
+    close_main_coroutine(mock_runner)
+
+    # A None entry in sys.modules makes importing that module fail
+    loop_module = FAKE_LOOP_MODULE if loop_module_name else None
+    fake_modules = {
+        name: loop_module if name == loop_module_name else None
+        for name in ("uvloop", "winloop")
+    }
+    original_uvloop = ananta_module.uvloop
+    try:
+        with (
+            patch.dict(sys.modules, fake_modules),
+            patch("sys.platform", platform),
+            patch("sys._is_gil_enabled", lambda: gil_enabled, create=True),
+        ):
             importlib.reload(ananta_module)
-            assert (
-                ananta_module.uvloop is mock_uvloop_module
-            ), "ananta.ananta.uvloop not set to uvloop on Linux"
+            if not gil_enabled:
+                loop_module = None
+            assert ananta_module.uvloop is loop_module
             with (
                 patch(
                     "ananta.ananta.argparse.ArgumentParser.parse_args",
@@ -229,104 +233,21 @@ def test_run_cli_platform_imports(mock_set_event_loop_policy, capsys, tmp_path):
                 patch("ananta.ananta.main", AsyncMock()),
             ):
                 ananta_module.run_cli()
-            mock_set_event_loop_policy.assert_called_with(
-                mock_uvloop_module.EventLoopPolicy()
-            )
-        finally:
-            sys.modules.clear()
-            sys.modules.update(original_sys_modules)
-            builtins.__import__ = (
-                _original_builtins_import  # Restore __import__
-            )
-            ananta_module.uvloop = original_ananta_uvloop
-            importlib.reload(ananta_module)
-
-    mock_set_event_loop_policy.reset_mock()
-
-    # Scenario 2: Windows, winloop success
-    with patch("sys.platform", "win32"):
-        mock_winloop_module = MagicMock(EventLoopPolicy=MagicMock())
-        sys.modules["winloop"] = mock_winloop_module
-        if "uvloop" in sys.modules:
-            del sys.modules["uvloop"]
-
-        try:
-            importlib.reload(ananta_module)
-            assert (
-                ananta_module.uvloop is mock_winloop_module
-            ), "ananta.ananta.uvloop not set to winloop on Windows"
-            with (
-                patch(
-                    "ananta.ananta.argparse.ArgumentParser.parse_args",
-                    return_value=args,
-                ),
-                patch("ananta.ananta.main", AsyncMock()),
-            ):
-                ananta_module.run_cli()
-            mock_set_event_loop_policy.assert_called_with(
-                mock_winloop_module.EventLoopPolicy()
-            )
-        finally:
-            sys.modules.clear()
-            sys.modules.update(original_sys_modules)
-            builtins.__import__ = _original_builtins_import
-            ananta_module.uvloop = original_ananta_uvloop
-            importlib.reload(ananta_module)
-
-    mock_set_event_loop_policy.reset_mock()
-
-    # Scenario 3: Linux, uvloop import fail
-    def mocked_import_uvloop_missing(
-        name, globals_map=None, locals_map=None, fromlist=(), level=0
-    ):
-        if name == "uvloop" or name == "winloop":  # Target specific modules
-            raise ImportError(f"Simulated import failure for {name}")
-        # Important: call the original import for other modules
-        return _original_builtins_import(
-            name, globals_map, locals_map, fromlist, level
+        mock_runner.assert_called_once_with(
+            loop_factory=fake_event_loop if loop_module else None
         )
-
-    with (
-        patch("sys.platform", "linux"),
-        patch("builtins.__import__", side_effect=mocked_import_uvloop_missing),
-    ):
-        try:
-            importlib.reload(ananta_module)
-            assert (
-                ananta_module.uvloop is None
-            ), "ananta.ananta.uvloop should be None when import is mocked to fail"
-
-            with (
-                patch(
-                    "ananta.ananta.argparse.ArgumentParser.parse_args",
-                    return_value=args,
-                ),
-                patch("ananta.ananta.main", AsyncMock()),
-            ):
-                ananta_module.run_cli()
-            mock_set_event_loop_policy.assert_not_called()
-        finally:
-            sys.modules.clear()
-            sys.modules.update(original_sys_modules)
-            builtins.__import__ = (
-                _original_builtins_import  # Ensure original import is restored
-            )
-            ananta_module.uvloop = original_ananta_uvloop
-            importlib.reload(ananta_module)
+    finally:
+        # The reload only rebinds module globals; restoring the loop module
+        # is enough to undo it without importing again
+        ananta_module.uvloop = original_uvloop
 
 
 @patch("ananta.ananta.main", new_callable=AsyncMock)  # Mock main
 @patch("ananta.ananta.argparse.ArgumentParser.parse_args")
 def test_run_cli_tui_light_option(mock_parse_args, mock_main_func):
     """Test that the --tui-light option is properly handled."""
-    mock_parse_args.return_value = MagicMock(
-        host_file="hosts.csv",
-        command=["cmd"],
-        version=False,
-        terminal_width=80,
-        tui=False,  # Regular tui is False
-        tui_light=True,  # But tui_light is True
-    )
+    # Regular tui is False, but tui_light is True
+    mock_parse_args.return_value = make_args(tui_light=True)
 
     # Mock urwid import to avoid TUI issues in test
     with patch.dict("sys.modules", {"urwid": MagicMock()}):
@@ -1,4 +1,4 @@
-import unittest
+import asyncio
 from importlib.metadata import version
 from unittest.mock import AsyncMock, MagicMock, patch
 
@@ -6,8 +6,8 @@ import pytest
 
 from ananta.ananta import main, run_cli
 
-# Mark all tests in this file as asyncio tests
-pytestmark = pytest.mark.asyncio
+# Fail any test in this file whose event loop callbacks block
+pytestmark = pytest.mark.usefixtures("no_blocking_calls")
 
 
 @pytest.fixture
@@ -26,7 +26,6 @@ def mock_args():
     )
 
 
-@pytest.mark.asyncio
 async def test_main_empty_hosts(tmp_path):
     p = tmp_path / "hosts.csv"
     p.write_text("", encoding="utf-8")
@@ -84,10 +83,9 @@ async def test_main_with_hosts_and_options(
         5,
     )  # (hosts_list, max_name_length)
 
-    # Create plain AsyncMocks for q1 and q2, as their 'put' method will be an AsyncMock by default.
-    q1, q2 = AsyncMock(), AsyncMock()
-    # Ensure Queue() constructor returns our specific mocks in order
-    mock_queue_cls.side_effect = [q1, q2]
+    # A plain AsyncMock for the shared queue; its 'put' is an AsyncMock
+    q = AsyncMock()
+    mock_queue_cls.return_value = q
 
     await main(
         host_file="dummy_hosts.toml",
@@ -103,16 +101,12 @@ async def test_main_with_hosts_and_options(
 
     mock_get_hosts.assert_called_once_with("dummy_hosts.toml", "test,prod")
 
-    assert mock_print_output.call_count == len(mock_hosts_data)
-    assert mock_execute.call_count == len(mock_hosts_data)
-
-    # Check print_output calls, including allow_cursor_control=True
-    mock_print_output.assert_any_call(
-        "host1", 5, True, True, True, unittest.mock.ANY, q1, False
-    )
-    mock_print_output.assert_any_call(
-        "host2", 5, True, True, True, unittest.mock.ANY, q2, False
+    # One shared queue and one printing task for all hosts
+    assert mock_queue_cls.call_count == 1
+    mock_print_output.assert_called_once_with(
+        5, True, True, True, q, False, ["host1", "host2"]
     )
+    assert mock_execute.call_count == len(mock_hosts_data)
 
     # Check execute calls
     mock_execute.assert_any_call(
@@ -126,7 +120,7 @@ async def test_main_with_hosts_and_options(
         100,
         True,
         "/default.key",
-        q1,
+        q,
         False,
         5.0,
         2,
@@ -142,11 +136,47 @@ async def test_main_with_hosts_and_options(
         100,
         True,
         "/default.key",
-        q2,
+        q,
         False,
         5.0,
         2,
     )
 
-    q1.put.assert_called_with(None)
-    q2.put.assert_called_with(None)
+    q.put.assert_called_once_with(None)
+
+
+@patch("ananta.ananta.print_output", new_callable=AsyncMock)
+@patch("ananta.ananta.get_hosts")
+async def test_main_limits_concurrent_hosts(mock_get_hosts, mock_print_output):
+    mock_get_hosts.return_value = (
+        [(f"host{i}", "10.0.0.1", 22, "user", "#", 5.0, 1) for i in range(5)],
+        5,
+    )
+    running = 0
+    peak = 0
+    done = []
+
+    async def fake_execute(host_name, *args):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0)
+        running -= 1
+        done.append(host_name)
+
+    with patch("ananta.ananta.execute", side_effect=fake_execute):
+        await main(
+            "hosts.csv",
+            "uptime",
+            80,
+            False,
+            False,
+            False,
+            None,
+            True,
+            None,
+            max_concurrency=2,
+        )
+
+    assert peak == 2
+    assert sorted(done) == [f"host{i}" for i in range(5)]
@@ -1,17 +1,22 @@
 import asyncio
 from unittest.mock import AsyncMock
 
-import pytest
+from ananta.ssh import STREAM_CHUNK_SIZE, stream_command_output
 
-from ananta.ssh import stream_command_output
 
-# Mark all tests in this file as asyncio tests
-pytestmark = pytest.mark.asyncio
+class MockSSHReader:
+    def __init__(self, chunks):
+        self._chunks = list(chunks)
+        self.read_sizes = []
+
+    async def read(self, n=-1):
+        self.read_sizes.append(n)
+        return self._chunks.pop(0) if self._chunks else ""
 
 
 class MockSSHProcess:
     def __init__(self, stdout_chunks):
-        self.stdout = self._async_iterator(stdout_chunks)
+        self.stdout = MockSSHReader(stdout_chunks)
         self.terminate_called = False
         self.wait_called = False
 
@@ -27,22 +32,16 @@ class MockSSHProcess:
     async def wait(self):
         self.wait_called = True
 
-    @staticmethod
-    async def _async_iterator(chunks):
-        for chunk in chunks:
-            yield chunk
-
 
-@pytest.mark.asyncio
 async def test_stream_command_output_various_chunks():
     """Test stream_command_output with various output chunks."""
     # 1. Setup
     mock_conn = AsyncMock()
     output_chunks = [
-        b"some bytes",
-        "a string",
+        b"some bytes\n",
+        "a string\n",
         b"\x80invalid utf-8",
-        "another string",
+        "another string\n",
         12345,  # Invalid type
     ]
     mock_process = MockSSHProcess(output_chunks)
@@ -57,12 +56,30 @@ async def test_stream_command_output_various_chunks():
     while not output_queue.empty():
         results.append(await output_queue.get())
 
-    assert "some bytes" in results
-    assert "a string" in results
-    assert (
-        "Host returns line with bytes that cannot be decoded: 'utf-8' codec can't decode byte 0x80 in position 0: invalid start byte"
-        in results
-    )
-    assert "another string" in results
+    assert "some bytes\n" in results
+    assert "a string\n" in results
+    # The undecodable byte is replaced; the rest of its line is kept
+    assert "\ufffdinvalid utf-8another string\n" in results
     assert "Host returns unprintable line: 12345" in results
-    assert len(results) == 5
+    assert len(results) == 4
+
+
+async def test_stream_command_output_splits_chunks_into_lines():
+    """Test that lines split across chunk boundaries are reassembled."""
+    mock_conn = AsyncMock()
+    output_chunks = ["first\nsec", "ond\n\nthi", "rd\nno newline"]
+    mock_process = MockSSHProcess(output_chunks)
+    mock_conn.create_process.return_value = mock_process
+    output_queue = asyncio.Queue()
+
+    await stream_command_output(mock_conn, "a command", 80, output_queue, True)
+
+    results = []
+    while not output_queue.empty():
+        results.append(await output_queue.get())
+
+    # Complete lines of each chunk arrive together as one item
+    assert results == ["first\n", "second\n\n", "third\n", "no newline"]
+    assert "".join(results) == "".join(output_chunks)
+    assert mock_process.stdout.read_sizes[0] == STREAM_CHUNK_SIZE
+    assert mock_process.terminate_called and mock_process.wait_called
@@ -6,22 +6,35 @@ from ananta.tui.ansi import _strip_ansi_control_sequences
 pytestmark = pytest.mark.tui
 
 
-@pytest.mark.parametrize(
-    "input_str, expected_output",
-    [
-        ("plain text", "plain text"),
-        ("\x1b[1mbold\x1b[0m", "\x1b[1mbold\x1b[0m"),  # SGR sequences are kept
-        ("\x1b[31mred\x1b[0m", "\x1b[31mred\x1b[0m"),  # SGR sequences are kept
-        ("\x1b[1Atext", "text"),  # Non-SGR CSI sequence is stripped
-        ("text\x1b[2J", "text"),  # Non-SGR CSI sequence is stripped
-        ("text\r\n", "text\r\n"),  # Carriage return and newline are kept
-        ("text\r", "text\r"),  # Carriage return is kept
-        (
-            "line1\rline2",
-            "line2",
-        ),  # Only the part after the last carriage return is kept
-    ],
-)
-def test_strip_ansi_control_sequences(input_str, expected_output):
+# (input, expected output) pairs, checked in one test: the function is
+# pure, so per-case test nodes only add collection and setup overhead
+STRIP_CASES = [
+    ("plain text", "plain text"),
+    ("\x1b[1mbold\x1b[0m", "\x1b[1mbold\x1b[0m"),  # SGR sequences are kept
+    ("\x1b[31mred\x1b[0m", "\x1b[31mred\x1b[0m"),  # SGR sequences are kept
+    ("\x1b[1Atext", "text"),  # Non-SGR CSI sequence is stripped
+    ("text\x1b[2J", "text"),  # Non-SGR CSI sequence is stripped
+    ("\x1b[?25lhidden\x1b[?25h", "hidden"),  # Private CSI modes stripped
+    (
+        "\x1b]0;title\x07\x1b[32mok\x1b[K\x1b]8;;\x1b\\",
+        "\x1b[32mok",
+    ),  # OSC (BEL or ST terminated) and CSI stripped in one pass
+    ("be\x07ll\x08\x9b", "bell"),  # C0 and C1 control characters
+    ("a\tb", "a\tb"),  # Tabs are kept for later expansion
+    ("\x1bPq#0\x1b\\sixel", "sixel"),  # DCS string is stripped
+    ("\x1b_apc\x1b\\\x1b^pm\x1b\\ok", "ok"),  # APC and PM stripped
+    ("\x1b[>4;1 q\x1b[2 @x", "x"),  # CSI intermediate bytes
+    ("text\r\n", "text\r\n"),  # Carriage return and newline are kept
+    ("text\r", "text\r"),  # Carriage return is kept
+    (
+        "line1\rline2",
+        "line2",
+    ),  # Only the part after the last carriage return is kept
+]
+
+
+def test_strip_ansi_control_sequences():
     """Test the _strip_ansi_control_sequences function."""
-    assert _strip_ansi_control_sequences(input_str) == expected_output
+    for input_str, expected_output in STRIP_CASES:
+        result = _strip_ansi_control_sequences(input_str)
+        assert result == expected_output, f"stripping {input_str!r}"
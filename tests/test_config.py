@@ -1,7 +1,8 @@
+import os
 import sys
 from unittest.mock import patch
 
-from ananta.config import get_hosts
+from ananta.config import _read_hosts_from_csv, get_hosts
 
 # Sample CSV content for testing
 HOSTS_CSV_CONTENT = """# This is a comment line
@@ -150,7 +151,7 @@ def test_get_hosts_skips_malformed(tmp_path, capsys):
 
     hosts, _ = get_hosts(str(p), None)
     assert len(hosts) == 4  # host-6 should be skipped
-    assert "host-6" not in [h[0] for h in hosts]
+    assert "host-6" not in {h[0] for h in hosts}
 
     # Check if the error message was printed (optional, requires capsys fixture)
     captured = capsys.readouterr()
@@ -340,13 +341,13 @@ def test_get_hosts_toml_python310_tomli_not_installed(tmp_path, capsys):
     )
 
 
-@patch("ananta.config.tomllib.load")
+@patch("ananta.config.tomllib")
 @patch("ananta.config.sys.version_info", (3, 11, 0))
-def test_get_hosts_toml_python311_uses_tomllib(mock_tomllib_load, tmp_path):
+def test_get_hosts_toml_python311_uses_tomllib(mock_tomllib, tmp_path):
     """Test TOML parsing on Python 3.11 uses tomllib."""
     p = tmp_path / "hosts.toml"
     p.write_text(HOSTS_TOML_CONTENT_NO_DEFAULTS, encoding="utf-8")
-    mock_tomllib_load.return_value = {
+    mock_tomllib.load.return_value = {
         "host-no-default-1": {
             "ip": "10.10.0.1",
             "port": 22,
@@ -367,7 +368,7 @@ def test_get_hosts_toml_python311_uses_tomllib(mock_tomllib_load, tmp_path):
         5.0,
         2,
     )
-    mock_tomllib_load.assert_called_once()
+    mock_tomllib.load.assert_called_once()
 
 
 def test_get_hosts_toml_python310_tomli_missing(tmp_path, capsys):
@@ -391,13 +392,13 @@ def test_get_hosts_toml_python310_tomli_missing(tmp_path, capsys):
         )
 
 
-@patch("ananta.config.tomllib.load")
+@patch("ananta.config.tomllib")
 @patch("ananta.config.sys.version_info", (3, 10, 0))
-def test_get_hosts_toml_python310_tomli_installed(mock_tomllib_load, tmp_path):
+def test_get_hosts_toml_python310_tomli_installed(mock_tomllib, tmp_path):
     """Test TOML parsing on Python 3.10 when tomli is installed."""
     p = tmp_path / "hosts.toml"
     p.write_text(HOSTS_TOML_CONTENT_NO_DEFAULTS, encoding="utf-8")
-    mock_tomllib_load.return_value = {
+    mock_tomllib.load.return_value = {
         "host-no-default-1": {
             "ip": "10.10.0.1",
             "port": 22,
@@ -418,7 +419,7 @@ def test_get_hosts_toml_python310_tomli_installed(mock_tomllib_load, tmp_path):
         5.0,
         2,
     )
-    mock_tomllib_load.assert_called_once()
+    mock_tomllib.load.assert_called_once()
 
 
 def test_get_hosts_toml_without_ip(tmp_path, capsys):
@@ -472,6 +473,17 @@ host-2,10.0.0.2  # Incomplete row
     assert "row 3 is incomplete" in captured.out
 
 
+def test_get_hosts_csv_quoted_field(tmp_path):
+    """Test that quoted CSV fields may still contain commas."""
+    csv_content = 'host-1,10.0.0.1,22,user1,"/keys/a,b.pem",web\n'
+    p = tmp_path / "hosts.csv"
+    p.write_text(csv_content, encoding="utf-8")
+    hosts, _ = get_hosts(str(p), "web")
+    assert hosts == [
+        ("host-1", "10.0.0.1", 22, "user1", "/keys/a,b.pem", 5.0, 2)
+    ]
+
+
 def test_get_hosts_csv_file_not_found(tmp_path, capsys):
     """Test FileNotFoundError in CSV parsing (lines 193-200)."""
     p = tmp_path / "nonexistent.csv"
@@ -480,3 +492,51 @@ def test_get_hosts_csv_file_not_found(tmp_path, capsys):
     assert max_len == 0
     captured = capsys.readouterr()
     assert "Error: CSV hosts file not found" in captured.out
+
+
+def test_get_hosts_cached_until_file_changes(tmp_path, capsys):
+    """Test that an unchanged file is parsed once and an edited one again."""
+    p = tmp_path / "hosts.csv"
+    p.write_text(HOSTS_CSV_CONTENT, encoding="utf-8")
+
+    with patch(
+        "ananta.config._read_hosts_from_csv", wraps=_read_hosts_from_csv
+    ) as mock_reader:
+        hosts, max_len = get_hosts(str(p), None)
+        hosts.clear()  # Callers get their own list
+        hosts_again, max_len_again = get_hosts(str(p), None)
+        assert mock_reader.call_count == 1
+        assert len(hosts_again) == 4
+        assert max_len_again == max_len
+        # Warnings are shown on every call, not only when parsing
+        assert capsys.readouterr().out.count("row 7") == 2
+
+        p.write_text("host-9,10.0.0.9,22,user9\n", encoding="utf-8")
+        mtime_ns = p.stat().st_mtime_ns + 1_000_000_000
+        os.utime(p, ns=(mtime_ns, mtime_ns))
+        hosts_edited, _ = get_hosts(str(p), None)
+        assert mock_reader.call_count == 2
+        assert [host[0] for host in hosts_edited] == ["host-9"]
+
+
+def test_get_hosts_csv_quoted_field_with_newline(tmp_path):
+    """Test that a quoted CSV field may span lines."""
+    csv_content = (
+        'host-1,10.0.0.1,22,user1,"/keys/a\nb.pem",web\n'
+        "host-2,10.0.0.2,22,user2,#,web\n"
+    )
+    p = tmp_path / "hosts.csv"
+    p.write_text(csv_content, encoding="utf-8")
+    hosts, _ = get_hosts(str(p), "web")
+    assert [host[0] for host in hosts] == ["host-1", "host-2"]
+    assert hosts[0][4] == "/keys/a\nb.pem"
+
+
+def test_get_hosts_csv_form_feed_keeps_row_numbers(tmp_path, capsys):
+    """Test that only newlines end a CSV row, so row numbers stay put."""
+    csv_content = "host-1,10.0.0.1,22,user1\x0c\nhost-2,10.0.0.2\n"
+    p = tmp_path / "hosts.csv"
+    p.write_text(csv_content, encoding="utf-8")
+    hosts, _ = get_hosts(str(p), None)
+    assert [host[0] for host in hosts] == ["host-1"]
+    assert "row 2 is incomplete" in capsys.readouterr().out
@@ -26,6 +26,8 @@ def clear_host_color_cache():
     from ananta.output import HOST_COLOR
 
     HOST_COLOR.clear()
+    get_prompt.cache_clear()
+    get_end_marker.cache_clear()
 
 
 def test_get_prompt_no_color():
@@ -153,57 +155,77 @@ def test_adjust_cursor_with_control(line_input, expected_output_with_control):
     assert adjusted == expected_output_with_control.rstrip()
 
 
-@pytest.mark.asyncio
 async def test_print_output_separate_output(capsys):
     """Test print_output with separate_output=True."""
     queue = AsyncMock()
     queue.get.side_effect = [
-        "line1\nline2\n",  # Multiline output
+        ("host-1", "line1\nline2\n"),  # Multiline output
+        ("host-2", "other\n"),
+        ("host-1", "line3\n"),
         None,  # Signal end
     ]
-    lock = AsyncMock()
     with patch("ananta.output.print") as mock_print:
         await print_output(
-            host_name="host-1",
             max_name_length=7,
             allow_empty_line=True,
             allow_cursor_control=False,
             separate_output=True,
-            print_lock=lock,
             output_queue=queue,
             color=False,
         )
-        # Verify print calls
-        expected_prompt = "[ host-1] "
-        mock_print.assert_any_call(f"{expected_prompt}line1{RESET}")
-        mock_print.assert_any_call(f"{expected_prompt}line2{RESET}")
-        # Verify lock was used
-        lock.__aenter__.assert_called()
+        # Each host's output is printed together once all hosts are done,
+        # one print call per output chunk
+        assert [c.args[0] for c in mock_print.call_args_list] == [
+            f"[ host-1] line1{RESET}\n[ host-1] line2{RESET}",
+            f"[ host-1] line3{RESET}",
+            f"[ host-2] other{RESET}",
+        ]
+
+
+async def test_print_output_separate_output_in_host_file_order():
+    """Test that held output follows the host file, not finishing order."""
+    queue = AsyncMock()
+    queue.get.side_effect = [
+        ("host-2", "second\n"),  # host-2 finishes first
+        ("host-1", "first\n"),
+        None,
+    ]
+    with patch("ananta.output.print") as mock_print:
+        await print_output(
+            max_name_length=7,
+            allow_empty_line=True,
+            allow_cursor_control=False,
+            separate_output=True,
+            output_queue=queue,
+            color=False,
+            host_names=["host-1", "host-2"],
+        )
+        assert [c.args[0] for c in mock_print.call_args_list] == [
+            f"[ host-1] first{RESET}",
+            f"[ host-2] second{RESET}",
+        ]
 
 
-@pytest.mark.asyncio
 async def test_print_output_interleaved(capsys):
     """Test print_output with separate_output=False."""
     queue = AsyncMock()
     queue.get.side_effect = [
-        "line1\n",  # Single line
-        "",  # Empty line
+        ("host-2", "line1\n"),  # Single line
+        ("host-2", ""),  # Empty line
+        ("host-1", "line2\n"),
         None,  # Signal end
     ]
-    lock = AsyncMock()
     with patch("ananta.output.print") as mock_print:
         await print_output(
-            host_name="host-2",
             max_name_length=7,
             allow_empty_line=False,
             allow_cursor_control=False,
             separate_output=False,
-            print_lock=lock,
             output_queue=queue,
             color=False,
         )
-        # Verify only non-empty line printed
-        expected_prompt = "[ host-2] "
-        mock_print.assert_called_once_with(f"{expected_prompt}line1{RESET}")
-        # Verify lock was used for each line
-        lock.__aenter__.assert_called()
+        # Verify only non-empty lines printed, as they arrive
+        assert [c.args[0] for c in mock_print.call_args_list] == [
+            f"[ host-2] line1{RESET}",
+            f"[ host-1] line2{RESET}",
+        ]
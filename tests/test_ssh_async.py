@@ -4,10 +4,15 @@ from unittest.mock import AsyncMock, MagicMock, patch
 import asyncssh
 import pytest
 
-from ananta.ssh import execute, execute_command, stream_command_output
-
-# Mark all tests in this file as asyncio tests
-pytestmark = pytest.mark.asyncio
+from ananta.ssh import (
+    AdmissionGate,
+    execute,
+    execute_command,
+    get_session_slots,
+    run_on,
+    set_max_sessions_per_connection,
+    stream_command_output,
+)
 
 
 async def test_execute_command_success_bytes():
@@ -83,6 +88,79 @@ async def test_execute_command_asyncssh_error():
     mock_conn.close.assert_not_called()
 
 
+async def test_execute_command_holds_session_slot():
+    """Test that execute_command runs inside the connection's session slot."""
+    mock_conn = AsyncMock()
+    mock_result = MagicMock()
+    mock_result.stdout = "output"
+
+    with patch("ananta.ssh.MAX_SESSIONS_PER_CONNECTION", 1):
+        slots = get_session_slots(mock_conn)
+
+        async def run_in_slot(*args, **kwargs):
+            assert slots.locked()  # The only slot is taken by this session
+            return mock_result
+
+        mock_conn.run.side_effect = run_in_slot
+
+        assert await execute_command(mock_conn, "cmd", 80, True) == "output"
+        assert get_session_slots(mock_conn) is slots
+        assert not slots.locked()  # The slot is released afterwards
+
+
+async def test_admission_gate_resizes_while_waiting():
+    """Test that raising the limit admits waiters and lowering it holds new ones."""
+    gate = AdmissionGate(1)
+    entered = []
+    release = asyncio.Event()
+
+    async def hold(n):
+        async with gate:
+            entered.append(n)
+            await release.wait()
+
+    tasks = [asyncio.create_task(hold(n)) for n in range(3)]
+    await asyncio.sleep(0)
+    assert entered == [0] and gate.locked()
+
+    await gate.set_limit(3)
+    await asyncio.sleep(0)
+    assert sorted(entered) == [0, 1, 2] and gate.active == 3
+
+    await gate.set_limit(1)
+    release.set()
+    await asyncio.gather(*tasks)
+    assert gate.active == 0 and not gate.locked()
+
+    with pytest.raises(ValueError):
+        AdmissionGate(0)
+
+
+async def test_admission_gate_cancelled_waiter_passes_wakeup():
+    """Test that cancelling a waiter does not strand the others."""
+    gate = AdmissionGate(1)
+    await gate.__aenter__()
+    waiter = asyncio.create_task(gate.__aenter__())
+    other = asyncio.create_task(gate.__aenter__())
+    await asyncio.sleep(0)
+
+    await gate.__aexit__(None, None, None)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    await asyncio.wait_for(other, timeout=1)
+    assert gate.active == 1
+
+
+async def test_set_max_sessions_per_connection():
+    """Test that the session limit applies to existing connections too."""
+    mock_conn = AsyncMock()
+    with patch("ananta.ssh.MAX_SESSIONS_PER_CONNECTION", 10):
+        slots = get_session_slots(mock_conn)
+        await set_max_sessions_per_connection(3)
+        assert slots.limit == 3
+        assert get_session_slots(AsyncMock()).limit == 3
+
+
 async def test_stream_command_output_success():
     """Test stream_command_output with successful streaming."""
     mock_conn = AsyncMock()
@@ -91,46 +169,45 @@ async def test_stream_command_output_success():
     mock_process.wait = AsyncMock()
     mock_process.__aenter__.return_value = mock_process
 
-    async def async_iterator():
-        yield b"line 1"
-        yield "line 2"
-        yield 123  # Invalid type
-
-    mock_process.stdout = async_iterator()
+    mock_process.stdout.read = AsyncMock(
+        side_effect=[b"line 1\n", "line 2\n", 123, ""]  # 123: invalid type
+    )
     mock_conn.create_process.return_value = mock_process
     output_queue = AsyncMock(spec=asyncio.Queue)
 
     await stream_command_output(mock_conn, "a command", 80, output_queue, True)
 
     assert output_queue.put.call_count == 3
-    output_queue.put.assert_any_await("line 1")
-    output_queue.put.assert_any_await("line 2")
+    output_queue.put.assert_any_await("line 1\n")
+    output_queue.put.assert_any_await("line 2\n")
     output_queue.put.assert_any_await("Host returns unprintable line: 123")
 
+    # Output is decoded by asyncssh in bulk, replacing invalid bytes
+    create_kwargs = mock_conn.create_process.call_args.kwargs
+    assert create_kwargs["encoding"] == "utf-8"
+    assert create_kwargs["errors"] == "replace"
+
     # Verify that terminate and wait were called
     mock_process.terminate.assert_called_once()
     mock_process.wait.assert_awaited_once()
 
 
 async def test_stream_command_output_unicode_error():
-    """Test stream_command_output with a UnicodeDecodeError."""
+    """Test stream_command_output with bytes that are not valid UTF-8."""
     mock_conn = AsyncMock()
     mock_process = AsyncMock()
     mock_process.terminate = MagicMock()  # Not async anymore
     mock_process.wait = AsyncMock()
     mock_process.__aenter__.return_value = mock_process
 
-    async def async_iterator():
-        yield b"\x80invalid"
-
-    mock_process.stdout = async_iterator()
+    mock_process.stdout.read = AsyncMock(side_effect=[b"\x80invalid", ""])
     mock_conn.create_process.return_value = mock_process
     output_queue = AsyncMock(spec=asyncio.Queue)
 
     await stream_command_output(mock_conn, "a command", 80, output_queue, True)
 
-    output_queue.put.assert_awaited_once()
-    assert "cannot be decoded" in output_queue.put.await_args.args[0]
+    # Invalid bytes are replaced rather than dropping the chunk
+    output_queue.put.assert_awaited_once_with("\ufffdinvalid")
 
     # Verify that terminate and wait were called
     mock_process.terminate.assert_called_once()
@@ -176,7 +253,7 @@ async def test_execute_connection_error(mock_establish_conn):
     )
 
     output_queue.put.assert_any_await(
-        "Error connecting to host1: Failed to connect"
+        ("host1", "Error connecting to host1: Failed to connect")
     )
 
 
@@ -232,7 +309,7 @@ async def test_execute_runtime_error(mock_establish_conn):
             2,
         )
         output_queue.put.assert_any_await(
-            "Error executing command on host1: Forced runtime error"
+            ("host1", "Error executing command on host1: Forced runtime error")
         )
 
 
@@ -382,3 +459,25 @@ async def test_execute_skips_close_if_already_closed(mock_establish_conn):
 
         # Verify connection close was NOT called (already closed)
         mock_conn.close.assert_not_called()
+
+
+@patch("ananta.ssh.establish_ssh_connection", new_callable=AsyncMock)
+async def test_run_on_shares_connection(mock_establish_conn):
+    """Test that run_on runs all commands over one connection."""
+    mock_conn = AsyncMock()
+    mock_conn.is_closed = MagicMock(return_value=False)
+    mock_conn.close = MagicMock()
+    mock_conn.run.side_effect = [
+        MagicMock(stdout="first\n"),
+        MagicMock(stdout="second\n"),
+    ]
+    mock_establish_conn.return_value = mock_conn
+
+    outputs = await run_on(
+        "1.1.1.1", 22, "user", None, None, ["cmd1", "cmd2"], 80, True
+    )
+
+    assert outputs == ["first\n", "second\n"]
+    mock_establish_conn.assert_awaited_once()
+    assert mock_conn.run.await_count == 2
+    mock_conn.close.assert_called_once()
@@ -3,16 +3,30 @@ from unittest.mock import patch
 
 import pytest
 
-from ananta.ssh import get_ssh_keys
+from ananta import LINES
+from ananta.ssh import (
+    build_remote_command,
+    find_default_ssh_keys,
+    get_encryption_algs,
+    get_ssh_keys,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_ssh_key_cache():
+    """Make sure every test looks up the default keys afresh."""
+    find_default_ssh_keys.cache_clear()
+    yield
+    find_default_ssh_keys.cache_clear()
 
 
-# Use patch to mock os.path.exists and os.path.expanduser
-@patch("ananta.ssh.os.path.exists")
+# Use patch to mock os.listdir and os.path.expanduser
+@patch("ananta.ssh.os.listdir")
 @patch(
     "ananta.ssh.os.path.expanduser",
     return_value="/fake/home/.ssh".replace("/", os.path.sep),
 )
-def test_get_ssh_keys(mock_expanduser, mock_exists):
+def test_get_ssh_keys(mock_expanduser, mock_listdir):
     """Tests the logic for selecting SSH keys."""
 
     # --- Scenario 1: Specific key path provided ---
@@ -23,74 +37,76 @@ def test_get_ssh_keys(mock_expanduser, mock_exists):
         "/another/key".replace("/", os.path.sep),
         "/default/key".replace("/", os.path.sep),
     ) == ["/another/key".replace("/", os.path.sep)]
-    # Ensure os.path.exists was not called in these cases
-    assert not mock_exists.called
-
-    # Reset mock calls for the next scenarios
-    mock_exists.reset_mock()
+    # Ensure ~/.ssh was not listed in these cases
+    assert not mock_listdir.called
 
     # --- Scenario 2: Host file specifies '#', default key provided ---
     assert get_ssh_keys(
         "#", "/path/to/default_key".replace("/", os.path.sep)
     ) == ["/path/to/default_key".replace("/", os.path.sep)]
-    assert not mock_exists.called
-
-    mock_exists.reset_mock()
+    assert not mock_listdir.called
 
     # --- Scenario 3: Host file specifies '#', no default key, check common keys ---
 
-    # Mock os.path.exists to simulate finding id_ed25519 first
-    def exists_side_effect_ed25519(path):
-        if path == "/fake/home/.ssh/id_ed25519".replace("/", os.path.sep):
-            return True
-        return False
-
-    mock_exists.side_effect = exists_side_effect_ed25519
-    expected_keys_ed25519 = [
-        os.path.join("/fake/home/.ssh".replace("/", os.path.sep), "id_ed25519")
+    # Simulate finding id_ed25519 and id_rsa, among other files
+    mock_listdir.return_value = [
+        "config",
+        "id_rsa",
+        "id_ed25519.pub",
+        "id_ed25519",
+        "known_hosts",
     ]
-    assert get_ssh_keys("#", None) == expected_keys_ed25519
-    # Check that expanduser was called once and exists was called for id_ed25519
+    expected_keys = [
+        os.path.join("/fake/home/.ssh".replace("/", os.path.sep), "id_ed25519"),
+        os.path.join("/fake/home/.ssh".replace("/", os.path.sep), "id_rsa"),
+    ]
+    assert get_ssh_keys("#", None) == expected_keys
     mock_expanduser.assert_called_once_with("~/.ssh".replace("/", os.path.sep))
-    mock_exists.assert_any_call(
-        "/fake/home/.ssh/id_ed25519".replace("/", os.path.sep)
+    mock_listdir.assert_called_once_with(
+        "/fake/home/.ssh".replace("/", os.path.sep)
     )
 
-    mock_exists.reset_mock()
-    mock_expanduser.reset_mock()  # Reset call count
-
-    # Mock os.path.exists to simulate finding only id_rsa
-    def exists_side_effect_rsa(path):
-        if path == "/fake/home/.ssh/id_rsa".replace("/", os.path.sep):
-            return True
-        return False
-
-    mock_exists.side_effect = exists_side_effect_rsa
-    expected_keys_rsa = [
-        os.path.join("/fake/home/.ssh".replace("/", os.path.sep), "id_rsa")
-    ]
-    assert get_ssh_keys("#", None) == expected_keys_rsa
-    mock_expanduser.assert_called_once_with("~/.ssh".replace("/", os.path.sep))
-    mock_exists.assert_any_call(
-        "/fake/home/.ssh/id_ed25519".replace("/", os.path.sep)
-    )  # Checked first
-    mock_exists.assert_any_call(
-        "/fake/home/.ssh/id_rsa".replace("/", os.path.sep)
-    )  # Then checked and found
-
-    mock_exists.reset_mock()
-    mock_expanduser.reset_mock()
-
-    # Mock os.path.exists to simulate finding no common keys
-    mock_exists.side_effect = lambda path: False
+    # --- Scenario 4: key_path is None or empty string (should behave like '#') ---
+    # The lookup is cached, so ~/.ssh is not listed again
+    assert get_ssh_keys(None, None) == expected_keys
+    assert get_ssh_keys("", None) == expected_keys
+    assert mock_listdir.call_count == 1
+
+    # --- Scenario 5: no common keys, or no ~/.ssh at all ---
+    find_default_ssh_keys.cache_clear()
+    mock_listdir.return_value = ["config", "known_hosts"]
+    with pytest.raises(ConnectionError, match="No SSH keys found"):
+        get_ssh_keys("#", None)
+    mock_listdir.side_effect = FileNotFoundError
     with pytest.raises(ConnectionError, match="No SSH keys found"):
         get_ssh_keys("#", None)
-    mock_expanduser.assert_called_once_with("~/.ssh".replace("/", os.path.sep))
-    assert mock_exists.call_count == 4  # Checked all common keys
 
-    # --- Scenario 4: key_path is None or empty string (should behave like '#') ---
-    mock_exists.reset_mock()
-    mock_expanduser.reset_mock()
-    mock_exists.side_effect = exists_side_effect_ed25519  # Find ed25519 again
-    assert get_ssh_keys(None, None) == expected_keys_ed25519
-    assert get_ssh_keys("", None) == expected_keys_ed25519
+    # Failures are not cached, so a key added later is found
+    mock_listdir.side_effect = None
+    mock_listdir.return_value = ["id_ecdsa"]
+    assert get_ssh_keys("#", None) == [
+        os.path.join("/fake/home/.ssh".replace("/", os.path.sep), "id_ecdsa")
+    ]
+
+
+def test_build_remote_command():
+    """Test that the terminal size is passed through the remote env."""
+    assert (
+        build_remote_command("uptime", 120)
+        == f"env COLUMNS=120 LINES={LINES} uptime"
+    )
+
+
+@pytest.mark.parametrize(
+    "has_aes, first_alg",
+    [
+        (True, "aes128-gcm@openssh.com"),
+        (False, "chacha20-poly1305@openssh.com"),
+    ],
+)
+def test_get_encryption_algs(has_aes, first_alg):
+    """Test that the cipher order follows AES hardware support."""
+    with patch("ananta.ssh.has_aes_acceleration", return_value=has_aes):
+        algs = get_encryption_algs()
+    assert algs[0] == first_alg
+    assert len(algs) == len(set(algs)) == 5
@@ -4,10 +4,13 @@ from unittest.mock import AsyncMock, patch
 import asyncssh
 import pytest
 
-from ananta.ssh import retry_connect
-
-# Mark all tests in this file as asyncio tests
-pytestmark = pytest.mark.asyncio
+from ananta.ssh import (
+    MAX_RETRY_DELAY,
+    establish_ssh_connection,
+    get_handshake_slots,
+    get_retry_delay,
+    retry_connect,
+)
 
 
 async def test_retry_connect_success():
@@ -77,9 +80,9 @@ async def test_retry_connect_success_after_one_retry_timeout():
         )
 
         assert mock_connect.call_count == 2  # Called twice (initial + 1 retry)
-        mock_sleep.assert_called_once_with(
-            1
-        )  # Ensure sleep was called between retries
+        # Ensure sleep was called between retries, backing off with jitter
+        mock_sleep.assert_called_once()
+        assert 1 <= mock_sleep.call_args.args[0] <= 2
         assert conn == mock_connection_object
 
 
@@ -321,3 +324,88 @@ async def test_retry_connect_fails_immediately_if_no_retries_allowed_ssh_error()
             excinfo.value
         )
         assert mock_connect.call_count == 1
+
+
+async def test_get_retry_delay_backs_off_exponentially():
+    """Tests that retry delays double per attempt, with jitter and a cap."""
+    for attempt in range(4):
+        assert 2**attempt <= get_retry_delay(attempt) <= 2**attempt + 1
+    assert get_retry_delay(10) == MAX_RETRY_DELAY
+
+
+async def test_retry_connect_limits_concurrent_handshakes():
+    """Tests that handshakes to one target are capped, others unaffected."""
+    active = 0
+    peak = 0
+
+    async def slow_connect(**kwargs):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return AsyncMock(spec=asyncssh.SSHClientConnection)
+
+    with (
+        patch("ananta.ssh.asyncssh.connect", new=slow_connect),
+        patch("ananta.ssh.MAX_HANDSHAKES_PER_TARGET", 2),
+        patch.dict("ananta.ssh._handshake_slots", clear=True),
+    ):
+        await asyncio.gather(
+            *(
+                retry_connect("10.0.0.9", 22, "user", ["/key"], 1.0, 0)
+                for _ in range(5)
+            )
+        )
+        assert peak == 2
+        assert get_handshake_slots("10.0.0.9", 22) is get_handshake_slots(
+            "10.0.0.9", 22
+        )
+        assert get_handshake_slots("10.0.0.9", 2222) is not (
+            get_handshake_slots("10.0.0.9", 22)
+        )
+
+
+def test_handshake_slots_are_per_event_loop():
+    """Tests that handshake gates work again under a new event loop."""
+
+    async def slow_connect(**kwargs):
+        await asyncio.sleep(0.01)
+        return AsyncMock(spec=asyncssh.SSHClientConnection)
+
+    async def connect_twice():
+        # Two connects to one target with one slot: the second one waits
+        await asyncio.gather(
+            *(
+                retry_connect("10.0.0.9", 22, "user", ["/key"], 1.0, 0)
+                for _ in range(2)
+            )
+        )
+        return get_handshake_slots("10.0.0.9", 22)
+
+    with (
+        patch("ananta.ssh.asyncssh.connect", new=slow_connect),
+        patch("ananta.ssh.MAX_HANDSHAKES_PER_TARGET", 1),
+    ):
+        # Like repeated run_cli calls, each with its own loop
+        first_slots = asyncio.run(connect_twice())
+        second_slots = asyncio.run(connect_twice())
+    assert first_slots is not second_slots
+
+
+async def test_establish_ssh_connection_does_not_rewrap_connection_error():
+    """Tests that ConnectionErrors propagate unchanged, others are wrapped."""
+    error = ConnectionError("Error connecting to 10.0.0.1: refused")
+    with patch("ananta.ssh.retry_connect", new=AsyncMock(side_effect=error)):
+        with pytest.raises(ConnectionError) as excinfo:
+            await establish_ssh_connection("10.0.0.1", 22, "user", "/key", None)
+    assert excinfo.value is error
+
+    with patch(
+        "ananta.ssh.retry_connect",
+        new=AsyncMock(side_effect=ValueError("bad key")),
+    ):
+        with pytest.raises(ConnectionError) as excinfo:
+            await establish_ssh_connection("10.0.0.1", 22, "user", "/key", None)
+    assert str(excinfo.value) == "Error connecting to 10.0.0.1: bad key"
+    assert isinstance(excinfo.value.__cause__, ValueError)
@@ -4,14 +4,19 @@ from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
 import urwid
 
-from ananta.tui import AnantaUrwidTUI
+from ananta.tui import (
+    _LIGHT_HOST_COLORS,
+    FRAME_INTERVAL,
+    AnantaUrwidTUI,
+    OutputWalker,
+)
 
 # Mark all tests in this file as TUI tests
 pytestmark = pytest.mark.tui
 
 
 @pytest.fixture
-def mock_tui():
+def mock_tui(mock_output_walker):
     """Fixture to create a mocked AnantaUrwidTUI instance for testing."""
     with (
         patch("ananta.tui.get_hosts") as mock_get_hosts,
@@ -43,7 +48,7 @@ def mock_tui():
         tui.output_box = mock_list_box
 
         # Replace walkers and boxes with mocks.
-        tui.output_walker = MagicMock(spec=urwid.SimpleFocusListWalker)
+        tui.output_walker = mock_output_walker
         tui.main_layout = MagicMock(spec=urwid.Frame)
         tui.prompt_attr_map = MagicMock(spec=urwid.AttrMap)
         tui.main_pile.focus_position = 2  # Start with input focused
@@ -53,6 +58,7 @@ def mock_tui():
         tui.loop.event_loop = MagicMock(spec=urwid.AsyncioEventLoop)
         tui.loop.screen = MagicMock()
         tui.loop.screen.get_cols_rows.return_value = (80, 24)
+        tui.loop.screen_size = None
 
         # Provide a basic mock for the asyncio_loop.
         # Tests that need a real loop will replace this.
@@ -120,28 +126,114 @@ def test_tui_initialization_separate_output_warning():
 
 
 def test_add_output_trimming(mock_tui):
-    """Test that the output walker is trimmed when it gets too long."""
+    """Test that the output buffer is bounded by the screen height."""
     # Configure screen size to calculate max_lines
     mock_tui.loop.screen.get_cols_rows.return_value = (80, 20)  # 20 rows
-    max_lines = 20 * 10  # rows * 10 -> 200
-    trim_lines = 20  # rows
-
-    current_length = max_lines + 1
-    # Make the mock walker report a length that exceeds the limit
-    mock_tui.output_walker.__len__.return_value = current_length
 
     mock_tui.add_output("A new line")
 
-    # Check that the trimming logic was called via __delitem__
-    mock_tui.output_walker.__delitem__.assert_called_once()
-    # Check that it was called with the correct slice to trim lines
-    call_args = mock_tui.output_walker.__delitem__.call_args
-    deleted_slice = call_args.args[0]
+    # The walker keeps ten screens of scrollback
+    assert mock_tui.output_walker.max_lines == 20 * 10
+    mock_tui.output_walker.append.assert_called_once()
+
+    # The size is queried once and reused until a resize resets it
+    mock_tui.add_output("Another line")
+    mock_tui.loop.screen.get_cols_rows.assert_called_once()
+    mock_tui.loop.screen_size = None
+    mock_tui.loop.screen.get_cols_rows.return_value = (80, 30)
+    mock_tui.add_output("After resize")
+    assert mock_tui.output_walker.max_lines == 30 * 10
+
+
+def test_output_walker_evicts_oldest_lines():
+    """Test that the deque-backed walker drops the oldest lines."""
+    walker = OutputWalker(max_lines=3)
+    for i in range(5):
+        walker.append(urwid.Text(f"line {i}"))
+    assert len(walker) == 3
+    assert [w.text for w in walker] == ["line 2", "line 3", "line 4"]
+
+    walker.set_focus(2)
+    assert walker.get_focus()[0].text == "line 4"
+    walker.append(urwid.Text("line 5"))
+    # Focus stays on the same line while its position shifts down
+    assert walker.focus == 1
+    assert walker.get_focus()[0].text == "line 4"
+    assert walker.get_next(2) == (None, None)
+    assert walker.get_prev(0) == (None, None)
+
+    # Shrinking keeps the newest lines
+    walker.max_lines = 2
+    assert [w.text for w in walker] == ["line 4", "line 5"]
+    assert walker.focus == 0
+
+    # Deferred appends signal the view once, on flush
+    modified = MagicMock()
+    urwid.connect_signal(walker, "modified", modified)
+    walker.append(urwid.Text("line 6"), notify=False)
+    walker.append(urwid.Text("line 7"), notify=False)
+    modified.assert_not_called()
+    walker.flush_modified()
+    walker.flush_modified()
+    modified.assert_called_once()
+    assert [w.text for w in walker] == ["line 6", "line 7"]
+
+    # A batch is appended with a single signal
+    modified.reset_mock()
+    walker.extend([urwid.Text("line 8"), urwid.Text("line 9")])
+    modified.assert_called_once()
+    assert [w.text for w in walker] == ["line 8", "line 9"]
+
+
+def test_add_output_batches_draws_per_frame(mock_tui):
+    """Test that bursts of output schedule one capped redraw."""
+    mock_tui.draw_screen_handle = None
+    mock_tui.loop.event_loop.alarm.reset_mock()
+    mock_tui._last_draw_ts = 100.0
+    mock_tui.output_walker.__len__.return_value = 3
+
+    with patch("ananta.tui.time.monotonic", return_value=100.01):
+        for i in range(3):
+            mock_tui.add_output(f"line {i}")
+
+    mock_tui.loop.event_loop.alarm.assert_called_once()
+    delay = mock_tui.loop.event_loop.alarm.call_args.args[0]
+    assert delay == pytest.approx(FRAME_INTERVAL - 0.01)
+    mock_tui.output_walker.set_focus.assert_not_called()
+    # Lines are appended without signalling the view for each one
+    assert all(
+        call.kwargs == {"notify": False}
+        for call in mock_tui.output_walker.append.call_args_list
+    )
+    mock_tui.output_walker.flush_modified.assert_not_called()
+
+    # Focus moves to the newest line once, when the frame is drawn
+    mock_tui._request_draw()
+    mock_tui.output_walker.set_focus.assert_called_once_with(2)
+    mock_tui.output_walker.flush_modified.assert_called_once()
+    mock_tui.loop.draw_screen.assert_called_once()
+    assert mock_tui.draw_screen_handle is None
+
+
+def test_build_palette_deduplicates_names(mock_tui):
+    """Test that the palette holds one entry per name, defaults first."""
+    palette = mock_tui._build_palette()
+    names = [entry[0] for entry in palette]
+    assert len(names) == len(set(names))
+    default_names = [entry[0] for entry in mock_tui.DEFAULT_PALETTE]
+    assert names[: len(default_names)] == default_names
+    assert {"host_host_1", "host_host_2"} <= set(names)
+
 
-    # This calculation now correctly matches the logic in the application code.
-    expected_stop_index = current_length - (max_lines - trim_lines)
-    assert deleted_slice.start == 0
-    assert deleted_slice.stop == expected_stop_index
+def test_host_colors_wrap_around(mock_tui):
+    """Test that host colors come from the theme set and wrap around."""
+    mock_tui.hosts = [(f"h{i}",) for i in range(14)]
+    mock_tui.light_theme = True
+    mock_tui.host_palette_definitions = {}
+    mock_tui._populate_host_palette_definitions()
+    colors = [e[1] for e in mock_tui.host_palette_definitions.values()]
+    assert set(colors) == set(_LIGHT_HOST_COLORS)
+    assert colors[:7] == colors[7:]
 
 
 def test_add_output_when_exiting(mock_tui):
@@ -169,7 +261,25 @@ def test_format_host_prompt():
         assert prompt_markup == [(expected_attr_name, f"[{expected_padding}] ")]
 
 
-@pytest.mark.asyncio
+def test_get_host_attr_name(mock_tui):
+    """Test that host names are sanitized into palette attribute names."""
+    assert mock_tui._get_host_attr_name("Web-01.example com") == (
+        "host_web_01_example_com"
+    )
+
+
+def test_host_prompts_are_cached(mock_tui):
+    """Test that host prompts are built once and reused."""
+    assert set(mock_tui.host_prompts) == {"host-1", "host-2"}
+    prompt = mock_tui._get_host_prompt("host-1")
+    assert prompt == [("host_host_1", "[host-1] ")]
+    assert mock_tui._get_host_prompt("host-1") is prompt
+
+    # Unknown hosts are formatted on first use and cached afterwards
+    other_prompt = mock_tui._get_host_prompt("other")
+    assert mock_tui.host_prompts["other"] is other_prompt
+
+
 async def test_connect_all_hosts_no_hosts(mock_tui):
     """Test connect_all_hosts when no hosts are found."""
     mock_tui.hosts = []  # Simulate no hosts
@@ -179,7 +289,6 @@ async def test_connect_all_hosts_no_hosts(mock_tui):
     assert "No hosts found" in str(mock_tui.add_output.call_args.args[0])
 
 
-@pytest.mark.asyncio
 async def test_connect_all_hosts_with_initial_command(mock_tui):
     """Test connect_all_hosts and that it runs an initial command."""
     mock_tui.initial_command = "uptime"
@@ -194,7 +303,6 @@ async def test_connect_all_hosts_with_initial_command(mock_tui):
     mock_tui.process_command.assert_called_once_with("uptime")
 
 
-@pytest.mark.asyncio
 async def test_connect_host_success(mock_tui):
     """Test the connection sequence for a single host that succeeds."""
     with patch(
@@ -202,6 +310,7 @@ async def test_connect_host_success(mock_tui):
     ) as mock_establish:
         # Using MagicMock for the connection object fixes the RuntimeWarning
         mock_conn = MagicMock()
+        mock_conn.wait_closed = AsyncMock()
         mock_establish.return_value = mock_conn
 
         host_details = mock_tui.hosts[0]  # ('host-1', ...)
@@ -215,13 +324,39 @@ async def test_connect_host_success(mock_tui):
         assert any("Connected." in str(m) for m in markup_calls)
 
 
-@pytest.mark.asyncio
+async def test_connection_close_drops_host_from_live_set(mock_tui):
+    """Test that commands skip hosts whose connection has since closed."""
+    closed = asyncio.Event()
+    mock_conn = MagicMock()
+    mock_conn.wait_closed = AsyncMock(side_effect=closed.wait)
+    with patch(
+        "ananta.tui.establish_ssh_connection", new_callable=AsyncMock
+    ) as mock_establish:
+        mock_establish.return_value = mock_conn
+        await mock_tui.connect_host(*mock_tui.hosts[0])
+    assert mock_tui._live_conns == {"host-1"}
+
+    closed.set()
+    await asyncio.gather(*mock_tui.async_tasks)
+    assert mock_tui._live_conns == set()
+
+    mock_tui.add_output = MagicMock()
+    mock_tui.input_field = MagicMock()
+    with patch.object(mock_tui, "run_command_on_host") as mock_run:
+        mock_tui.process_command("uptime")
+    mock_run.assert_not_called()
+    # The conn object is never asked whether it is closed
+    mock_conn.is_closed.assert_not_called()
+    skipped = [str(c.args[0]) for c in mock_tui.add_output.call_args_list]
+    assert sum("Not connected" in m for m in skipped) == 2
+
+
 async def test_run_command_interleaved_output_and_empty_lines(mock_tui):
     """Tests interleaved command output and empty line handling."""
     mock_tui.asyncio_loop = asyncio.get_running_loop()
     mock_tui.separate_output = False
     mock_tui.allow_empty_line = True
-    mock_tui.add_output = MagicMock()
+    mock_tui.add_output_lines = MagicMock()
 
     async def feed_queue(q):
         await q.put("line 1")
@@ -238,19 +373,37 @@ async def test_run_command_interleaved_output_and_empty_lines(mock_tui):
         mock_stream.assert_awaited_once()
 
     await feeder_task
-    # add_output called for "line 1" and for the empty line
-    assert mock_tui.add_output.call_count == 2
-    second_call_arg = mock_tui.add_output.call_args_list[1].args[0]
-    assert "" in second_call_arg  # Check the empty line was added
+    # The buffered burst is drained and added as one batch
+    mock_tui.add_output_lines.assert_called_once()
+    lines = mock_tui.add_output_lines.call_args.args[0]
+    assert len(lines) == 2  # "line 1" and the empty line
+    assert "" in lines[1]  # Check the empty line was added
+
+
+async def test_run_command_splits_chunked_output(mock_tui):
+    """Tests that an output chunk holding several lines is split on LF."""
+    mock_tui.asyncio_loop = asyncio.get_running_loop()
+    mock_tui.allow_empty_line = True
+    mock_tui.add_output_lines = MagicMock()
+
+    async def stream(conn, command, width, queue, color):
+        await queue.put("one\r\n\nfoo\rtwo\n")
+
+    with patch("ananta.tui.stream_command_output", new=stream):
+        await mock_tui.run_command_on_host("host-1", MagicMock(), "cmd")
+
+    lines = mock_tui.add_output_lines.call_args.args[0]
+    # Each line is the host prompt followed by the line's markup
+    texts = [m[-1] if isinstance(m[-1], str) else m[-1][1] for m in lines]
+    assert texts == ["one", "", "two"]
 
 
-@pytest.mark.asyncio
 async def test_run_command_on_host_raises_error(mock_tui):
     """
     Tests that an error during command execution is caught and displayed.
     """
     mock_tui.asyncio_loop = asyncio.get_running_loop()
-    mock_tui.add_output = MagicMock()
+    mock_tui.add_output_lines = MagicMock()
 
     # Use an AsyncMock that will raise an exception when awaited by the stream_task
     mock_stream = AsyncMock(side_effect=Exception("command failed"))
@@ -260,10 +413,66 @@ async def test_run_command_on_host_raises_error(mock_tui):
         await mock_tui.run_command_on_host("host-1", MagicMock(), "cmd")
 
     # Verify that the command error is now correctly captured and displayed.
-    markup_calls = [c.args[0] for c in mock_tui.add_output.call_args_list]
+    markup_calls = [
+        m for c in mock_tui.add_output_lines.call_args_list for m in c.args[0]
+    ]
     assert any("Cmd error" in str(m) for m in markup_calls)
 
 
+async def test_run_command_on_host_with_full_queue(mock_tui):
+    """
+    Tests that the end marker and errors still arrive when the bounded
+    output queue is full as the stream finishes.
+    """
+    mock_tui.asyncio_loop = asyncio.get_running_loop()
+    mock_tui.add_output_lines = MagicMock()
+    mock_tui.output_queues["host-1"] = asyncio.Queue(maxsize=2)
+
+    async def fill_and_fail(conn, command, width, queue, color):
+        await queue.put("line 1")
+        await queue.put("line 2")
+        raise Exception("command failed")
+
+    with patch("ananta.tui.stream_command_output", new=fill_and_fail):
+        await asyncio.wait_for(
+            mock_tui.run_command_on_host("host-1", MagicMock(), "cmd"),
+            timeout=1,
+        )
+
+    markup_calls = [
+        str(m)
+        for c in mock_tui.add_output_lines.call_args_list
+        for m in c.args[0]
+    ]
+    assert "line 1" in markup_calls[0] and "line 2" in markup_calls[1]
+    assert "Cmd error" in markup_calls[2]
+
+
+async def test_run_command_on_host_tracks_blocked_put(mock_tui):
+    """
+    Tests that an end marker put that blocks on a full queue after the
+    reader stopped is tracked, so that shutdown can cancel it.
+    """
+    mock_tui.asyncio_loop = asyncio.get_running_loop()
+    mock_tui.output_queues["host-1"] = asyncio.Queue(maxsize=1)
+
+    async def exit_and_fail(conn, command, width, queue, color):
+        await queue.put("line 1")
+        mock_tui.is_exiting = True
+        raise Exception("command failed")
+
+    with patch("ananta.tui.stream_command_output", new=exit_and_fail):
+        await mock_tui.run_command_on_host("host-1", MagicMock(), "cmd")
+    await asyncio.sleep(0)  # Let the stream task's done callback run
+
+    # The error line filled the queue; the end marker waits behind it
+    (put_task,) = mock_tui.async_tasks
+    assert not put_task.done()
+    put_task.cancel()
+    await asyncio.gather(put_task, return_exceptions=True)
+    assert not mock_tui.async_tasks
+
+
 def test_handle_input(mock_tui):
     """Tests the main input handler."""
     mock_tui.process_command = MagicMock()
@@ -315,7 +524,6 @@ def test_initiate_exit_no_loop(mock_tui):
     mock_tui._direct_exit_loop.assert_called_once()
 
 
-@pytest.mark.asyncio
 async def test_perform_shutdown_with_timeout(mock_tui):
     """Test shutdown where closing a connection times out."""
     mock_tui.asyncio_loop = asyncio.get_running_loop()
@@ -1,7 +1,17 @@
 import pytest
 import urwid
 
-from ananta.tui.ansi import _AnsiState, ansi_to_urwid_markup
+from ananta.tui.ansi import (
+    _STYLE_BOLD,
+    _STYLE_CONCEAL,
+    _STYLE_REVERSE,
+    _STYLE_UNDERLINE,
+    _AnsiState,
+    _cached_ansi_to_markup,
+    _parse_sgr_params,
+    ansi_to_urwid_markup,
+    ansi_to_urwid_markup_with_prefix,
+)
 
 # Mark all tests in this file as TUI tests
 pytestmark = pytest.mark.tui
@@ -12,7 +22,7 @@ def test_ansi_state_defaults():
     state = _AnsiState()
     assert state.fg == "default"
     assert state.bg == "default"
-    assert state.styles == set()
+    assert state.styles == 0
     spec = state.get_attr_spec()
     assert spec.foreground == "default"
     assert spec.background == "default"
@@ -21,8 +31,7 @@ def test_ansi_state_defaults():
 def test_ansi_state_styling():
     """Tests applying styles and colors to _AnsiState."""
     state = _AnsiState()
-    state.styles.add("bold")
-    state.styles.add("underline")
+    state.styles |= _STYLE_BOLD | _STYLE_UNDERLINE
     state.fg = "light red"
     state.bg = "dark blue"
 
@@ -37,7 +46,7 @@ def test_ansi_state_styling():
 def test_ansi_state_reverse():
     """Tests the 'reverse' style which swaps foreground and background."""
     state = _AnsiState()
-    state.styles.add("reverse")
+    state.styles |= _STYLE_REVERSE
     state.fg = "light red"
     state.bg = "dark blue"
 
@@ -49,7 +58,7 @@ def test_ansi_state_reverse():
 def test_ansi_state_conceal():
     """Tests the 'conceal' style which makes foreground same as background."""
     state = _AnsiState()
-    state.styles.add("conceal")
+    state.styles |= _STYLE_CONCEAL
     state.fg = "light red"
     state.bg = "dark blue"
 
@@ -58,15 +67,57 @@ def test_ansi_state_conceal():
     assert spec.background == "dark blue"
 
 
+def test_ansi_state_attr_spec_is_cached():
+    """Tests that identical states share one AttrSpec."""
+    state = _AnsiState(fg="light red", styles=_STYLE_BOLD)
+    other_state = _AnsiState(fg="light red", styles=_STYLE_BOLD)
+    assert state.get_attr_spec() is other_state.get_attr_spec()
+
+
 def test_ansi_state_reset():
     """Tests resetting the state to defaults."""
     state = _AnsiState()
-    state.styles.add("bold")
+    state.styles |= _STYLE_BOLD
     state.fg = "light red"
     state.reset()
     assert state.fg == "default"
     assert state.bg == "default"
-    assert state.styles == set()
+    assert state.styles == 0
+
+
+def test_parse_sgr_params_is_cached():
+    """Tests that SGR parameter strings are parsed once into int tuples."""
+    params = _parse_sgr_params("1;;38;5;208")
+    assert params == (1, -1, 38, 5, 208)
+    assert _parse_sgr_params("1;;38;5;208") is params
+
+
+def test_ansi_to_urwid_markup_is_cached():
+    """Tests that repeated colored lines reuse the cached markup."""
+    _cached_ansi_to_markup.cache_clear()
+    line = "\x1b[32mOK\x1b[0m done"
+    first = ansi_to_urwid_markup(line)
+    second = ansi_to_urwid_markup(line)
+    assert _cached_ansi_to_markup.cache_info().hits == 1
+    # Callers get their own list to modify
+    assert first == second and first is not second
+    # Long lines bypass the cache
+    ansi_to_urwid_markup("\x1b[32m" + "x" * 300)
+    assert _cached_ansi_to_markup.cache_info().currsize == 1
+
+
+@pytest.mark.parametrize(
+    "line", ["plain text", "\x1b[32mOK\x1b[0m done", "\x1b[1m" + "x" * 300]
+)
+def test_ansi_to_urwid_markup_with_prefix(line):
+    """Tests that the prefix leads the markup of lines with text."""
+    prefix = [("host_0", "[host-1] ")]
+    markup = ansi_to_urwid_markup_with_prefix(prefix, line)
+    assert markup[0] == prefix[0]
+    assert markup[1:] == ansi_to_urwid_markup(line)
+    # Lines without text give no markup, not a bare prefix
+    assert ansi_to_urwid_markup_with_prefix(prefix, "") == []
+    assert ansi_to_urwid_markup_with_prefix(prefix, "\x1b[31m") == []
 
 
 @pytest.mark.parametrize(
@@ -168,6 +219,29 @@ def test_ansi_state_reset():
             "Final text segment",
             [(urwid.AttrSpec("default", "default"), "Final text segment")],
         ),
+        (
+            "\x1b[1;31mred\x1b[0;32mgreen",
+            [
+                (urwid.AttrSpec("bold,dark red", "default"), "red"),
+                (urwid.AttrSpec("dark green", "default"), "green"),
+            ],
+        ),
+        (
+            "col1\tcol2",
+            [(urwid.AttrSpec("default", "default"), "col1    col2")],
+        ),
+        (
+            "\x1b[31mab\x1b[0m\tc\td",
+            [
+                (urwid.AttrSpec("dark red", "default"), "ab"),
+                (urwid.AttrSpec("default", "default"), "      c       d"),
+            ],
+        ),
+        ("", []),
+        (
+            "\x1b[;;94;;104mbright",
+            [(urwid.AttrSpec("light blue", "light blue"), "bright")],
+        ),
     ],
 )
 def test_ansi_to_urwid_markup(input_str, expected_markup):
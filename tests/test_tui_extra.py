@@ -12,7 +12,7 @@ pytestmark = pytest.mark.tui
 
 
 @pytest.fixture
-def mock_tui():
+def mock_tui(mock_output_walker):
     """Fixture to create a mocked AnantaUrwidTUI instance for testing."""
     with patch("ananta.tui.get_hosts") as mock_get_hosts:
         mock_hosts_data = [("host-1", "10.0.0.1", 22, "user1", "/key1", 5.0, 2)]
@@ -27,12 +27,13 @@ def mock_tui():
             allow_empty_line=True,
         )
 
-        tui.output_walker = MagicMock(spec=urwid.SimpleFocusListWalker)
+        tui.output_walker = mock_output_walker
         tui.main_layout = MagicMock(spec=urwid.Frame)
         tui.loop = MagicMock(spec=urwid.MainLoop)
         tui.loop.screen = MagicMock()
         tui.loop.event_loop = MagicMock()
         tui.loop.screen.get_cols_rows.return_value = (80, 24)
+        tui.loop.screen_size = None
         tui.asyncio_loop = MagicMock()
         tui.asyncio_loop.is_closed.return_value = False
         tui.is_exiting = False
@@ -58,7 +59,53 @@ def test_process_command_exit_and_empty(mock_tui):
     mock_tui.initiate_exit.assert_not_called()
 
 
-@pytest.mark.asyncio
+async def test_connect_all_hosts_connects_concurrently(mock_tui):
+    """Test that hosts are connected in parallel, not one after another."""
+    mock_tui.hosts = [
+        ("host-1", "10.0.0.1", 22, "user1", "/key1", 5.0, 2),
+        ("host-2", "10.0.0.2", 22, "user2", "/key2", 5.0, 2),
+    ]
+    in_flight = 0
+    max_in_flight = 0
+
+    async def slow_connect(*host_details):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    mock_tui.connect_host = AsyncMock(side_effect=slow_connect)
+
+    await mock_tui.connect_all_hosts()
+
+    assert mock_tui.connect_host.await_count == 2
+    assert max_in_flight == 2
+
+
+async def test_process_command_max_sessions(mock_tui):
+    """Test that 'max-sessions N' changes the session limit, not runs."""
+    mock_tui.add_output = MagicMock()
+    mock_tui.run_command_on_host = AsyncMock()
+    mock_tui.input_field = MagicMock()
+
+    with patch(
+        "ananta.tui.set_max_sessions_per_connection", new_callable=AsyncMock
+    ) as mock_set_limit:
+        mock_tui.process_command("max-sessions 4")
+        await asyncio.gather(*mock_tui.async_tasks)
+        mock_set_limit.assert_awaited_once_with(4)
+
+        mock_tui.process_command("max-sessions 0")
+        mock_tui.process_command("MAX-SESSIONS many")
+        assert mock_set_limit.await_count == 1
+
+    mock_tui.run_command_on_host.assert_not_called()
+    outputs = [str(c.args[0]) for c in mock_tui.add_output.call_args_list]
+    assert any("set to 4" in o for o in outputs)
+    assert sum("Usage: max-sessions" in o for o in outputs) == 2
+
+
 async def test_run_command_separate_output(mock_tui):
     """Tests command execution with separate_output=True."""
     mock_tui.asyncio_loop = asyncio.get_running_loop()
@@ -83,7 +130,6 @@ async def test_run_command_separate_output(mock_tui):
     # --- FIX END ---
 
 
-@pytest.mark.asyncio
 async def test_run_command_on_host_cancelled(mock_tui):
     """Test command cancellation during execution."""
     mock_tui.asyncio_loop = asyncio.get_running_loop()
@@ -116,7 +162,6 @@ async def test_run_command_on_host_cancelled(mock_tui):
     )
 
 
-@pytest.mark.asyncio
 async def test_perform_shutdown_cancels_tasks(mock_tui):
     """Test that perform_shutdown cancels pending async tasks."""
     mock_tui.asyncio_loop = asyncio.get_running_loop()
@@ -132,17 +177,44 @@ async def test_perform_shutdown_cancels_tasks(mock_tui):
     )
 
 
-def test_add_output_when_exiting_with_keywords(mock_tui):
-    """Test that output containing specific keywords is still added when exiting."""
+def test_add_output_when_exiting_with_force(mock_tui):
+    """Test that only forced output is still added when exiting."""
     mock_tui.is_exiting = True
 
     mock_tui.add_output("regular message")
+    # Message text no longer decides whether output is shown
+    mock_tui.add_output("An error occurred during shutdown")
     mock_tui.output_walker.append.assert_not_called()
 
-    mock_tui.add_output("An error occurred during shutdown")
+    mock_tui.add_output("Cleanup complete.", force=True)
+    mock_tui.output_walker.append.assert_called_once()
+
+    mock_tui.output_walker.append.reset_mock()
+    mock_tui.add_output_lines(["host line"])
+    mock_tui.output_walker.append.assert_not_called()
+    mock_tui.add_output_lines(["Closing..."], force=True)
     mock_tui.output_walker.append.assert_called_once()
 
 
+async def test_connect_host_failure_shown_while_exiting(mock_tui):
+    """Test that a connection failing during exit is still reported."""
+
+    async def fail_during_exit(*args):
+        mock_tui.is_exiting = True
+        raise OSError("Connection refused")
+
+    with patch(
+        "ananta.tui.establish_ssh_connection", side_effect=fail_during_exit
+    ):
+        await mock_tui.connect_host(*mock_tui.hosts[0])
+
+    appended = [
+        str(c.args[0].get_text())
+        for c in mock_tui.output_walker.append.call_args_list
+    ]
+    assert any("Connection failed: Connection refused" in t for t in appended)
+
+
 @patch("ananta.tui.urwid.AsyncioEventLoop")
 @patch("ananta.tui.AnantaMainLoop")
 def test_run_method_exceptions(mock_main_loop, mock_event_loop, mock_tui):
@@ -169,3 +241,20 @@ def test_run_method_exceptions(mock_main_loop, mock_event_loop, mock_tui):
             "\nAnanta TUI encountered an unexpected error: A test error"
         )
         mock_traceback.assert_called_once()
+
+
+@patch("ananta.tui.urwid.AsyncioEventLoop")
+@patch("ananta.tui.AnantaMainLoop")
+def test_run_method_uses_loop_factory(
+    mock_main_loop, mock_event_loop, mock_tui
+):
+    """Test that run() builds its asyncio loop with the given factory."""
+    loop = asyncio.new_event_loop()
+    loop_factory = MagicMock(return_value=loop)
+
+    with patch("builtins.print"):
+        mock_tui.run(loop_factory=loop_factory)
+
+    loop_factory.assert_called_once_with()
+    mock_event_loop.assert_called_once_with(loop=loop)
+    assert loop.is_closed()
@@ -1,3 +1,5 @@
+from unittest.mock import patch
+
 import pytest
 import urwid
 
@@ -33,6 +35,23 @@ class TestListBoxWithScrollBar:
         listbox.render((80, 10))
         assert listbox._scrollbar.text == ""
 
+    def test_render_reuses_unchanged_scrollbar(self):
+        """Test that the scrollbar is only rebuilt when its state changes."""
+        widgets = [urwid.Text(f"Line {i}") for i in range(20)]
+        walker = urwid.SimpleFocusListWalker(widgets)
+        listbox = ListBoxWithScrollBar(walker)
+
+        with patch.object(
+            listbox._scrollbar, "set_text", wraps=listbox._scrollbar.set_text
+        ) as mock_set_text:
+            listbox.render((80, 10))
+            listbox.render((80, 10))
+            assert mock_set_text.call_count == 1
+
+            walker.set_focus(15)
+            listbox.render((80, 10))
+            assert mock_set_text.call_count == 2
+
     def test_keypress_forwarding(self):
         """Test that keypresses are forwarded to the internal ListBox."""
         widgets = [urwid.Text(f"Line {i}") for i in range(10)]